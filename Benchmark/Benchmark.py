@@ -0,0 +1,251 @@
+import os
+import json
+import itertools
+import traceback
+import numpy as np
+from time import perf_counter
+from VisionSystem import VisionSystem, VisualObject, VideoStream, ExecutionModes
+from VisionSystem.DetectionModel import ThreshBlob
+from VisionSystem.DetectionModel.ThreshBlob import BlobEngines
+import Instrumentation
+
+
+REPORT_VERSION = 1
+
+# the percentiles reported for every timed stage
+PERCENTILES = (50, 95, 99)
+
+# stages of detection timed by Instrumentation, in the order they run. Each is reported (and
+# compared against the baseline) alongside the whole frame and each object. Stages run in the
+# Processes execution mode's workers aren't seen, see Instrumentation
+INSTRUMENTED_STAGES = ["convert", "threshold", "morphology", "blobs", "geometry"]
+
+# (name, real size, result limit) of the objects the robot tracks, as in main.py
+OBJECTS = [
+    ("ball", (0.043, 0.043, 0.043), 1),
+    ("obstacle", (0.18, 0.18, 0.2), None),
+    ("blue_goal", (0.3, 0.3, 0.1), 1),
+    ("yellow_goal", (0.3, 0.3, 0.1), 1)
+]
+
+# every option of a benchmark configuration, with its default (also the command line's). The
+# default engine is the one that runs the shipped models on every OpenCV version
+DEFAULT_OPTIONS = {
+    "downsample_scale": 1,
+    "fused": False,
+    "compiled": False,
+    "blob_engine": BlobEngines.ConnectedComponents.name,
+    "execution_mode": ExecutionModes.Serial.name
+}
+
+
+
+# Replays a recording through the VisionSystem with the real detection models, under each
+# configuration of a matrix of options, timing every frame, every object's detection and every
+# stage of it (see INSTRUMENTED_STAGES) and keeping what was detected, so that runs can be
+# compared against a stored baseline
+class Benchmark():
+
+    def __init__(self, video_path, models_dir, frames=300, warmup=10):
+        # video_path <str>
+        # recording (or FrameStore) to replay
+        self.video_path = video_path
+
+        # models_dir <str>
+        # directory holding <object>_model.threshblob.json for every object in OBJECTS
+        self.models_dir = models_dir
+
+        # frames <int?>
+        # number of frames to time from the start of the recording, None for all of them
+        self.frames = frames
+
+        # warmup <int>
+        # frames run before timing starts, so that one-off costs (eg. compiling lookup tables,
+        # starting worker pools) don't count
+        self.warmup = warmup
+
+
+    def run(self, matrix):
+        # matrix <dict<key=str, val=list>>
+        # values to try for each option in DEFAULT_OPTIONS. Every combination is run
+        return {
+            "version": REPORT_VERSION,
+            "video": os.path.abspath(self.video_path),
+            "frames": self.frames,
+            "warmup": self.warmup,
+            "configs": [self.run_config(options) for options in expand_matrix(matrix)]
+        }
+
+
+    def run_config(self, options):
+        options = dict(DEFAULT_OPTIONS, **options)
+        config = {"name": config_name(options), "options": options}
+
+        try:
+            config.update(self.replay(options))
+        except Exception:
+            # eg. an engine that can't run these models. Recorded, so the rest of the matrix still runs
+            config["error"] = traceback.format_exc()
+
+        return config
+
+
+    def replay(self, options):
+        video_stream = VideoStream(self.video_path, downsample_scale=options["downsample_scale"])
+        vision_system = self.make_vision_system(options, video_stream.resolution[0])
+        names = list(vision_system.objects_to_track.keys())
+
+        stage_times = {stage: [] for stage in ["frame"] + names}
+        detections = {name: [] for name in names}
+
+        # every configuration is timed with instrumentation on, so that its overhead is the same
+        # for all of them and their baselines
+        was_enabled = Instrumentation.is_enabled()
+        Instrumentation.enable()
+        Instrumentation.reset()
+        try:
+            for frame_idx, frame in enumerate(video_stream):
+                if self.frames is not None and frame_idx >= self.warmup + self.frames:
+                    break
+                if frame_idx == self.warmup:
+                    Instrumentation.reset()
+
+                start = perf_counter()
+                vision_system.update_with_frame(frame)
+                elapsed = perf_counter() - start
+                frame.release()
+
+                if frame_idx < self.warmup:
+                    continue
+
+                stage_times["frame"].append(elapsed)
+                for name in names:
+                    stage_times[name].append(vision_system.object_timings.get(name, 0))
+                    detections[name].append([
+                        [list(result.coords[0]), list(result.coords[1])]
+                        for result in vision_system.objects_to_track[name].detection_results
+                    ])
+            stage_stats = Instrumentation.stats(PERCENTILES)
+        finally:
+            Instrumentation.reset()
+            Instrumentation.enable(was_enabled)
+            vision_system.close()
+            video_stream.close()
+
+        stages = {stage: summarize(times) for stage, times in stage_times.items()}
+        for stage in INSTRUMENTED_STAGES:
+            if stage in stage_stats:
+                stages[stage] = {key: float(val) for key, val in stage_stats[stage].items()}
+
+        frame_times = stage_times["frame"]
+        return {
+            "resolution": list(video_stream.resolution),
+            "timed_frames": len(frame_times),
+            "fps": len(frame_times) / sum(frame_times) if frame_times else 0,
+            "stages": stages,
+            "frame_times": frame_times,
+            "detections": detections
+        }
+
+
+    def make_vision_system(self, options, camera_pixel_width):
+        objects_to_track = {}
+        for name, size, result_limit in OBJECTS:
+            model = ThreshBlob.load(os.path.join(self.models_dir, name + "_model.threshblob.json"))
+            model.blob_engine = BlobEngines[options["blob_engine"]]
+            model.thresholder.compiled = options["compiled"]
+            objects_to_track[name] = VisualObject(real_size=size, detection_model=model, result_limit=result_limit)
+
+        return VisionSystem(
+            objects_to_track,
+            camera_pixel_width,
+            fused=options["fused"],
+            execution_mode=ExecutionModes[options["execution_mode"]]
+        )
+
+
+
+def expand_matrix(matrix):
+    # every combination of the option values in matrix, in a stable order
+    keys = sorted(matrix.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*[matrix[key] for key in keys])]
+
+
+def config_name(options):
+    return ",".join("%s=%s" % (key, options[key]) for key in sorted(options.keys()))
+
+
+def summarize(times):
+    if not times:
+        return {"mean": 0, "total": 0}
+
+    summary = {"p%d" % percentile: float(val) for percentile, val in zip(PERCENTILES, np.percentile(times, PERCENTILES))}
+    summary["mean"] = float(np.mean(times))
+    summary["total"] = float(np.sum(times))
+    return summary
+
+
+def compare(report, baseline, time_tolerance=0.1, pixel_tolerance=0):
+    # findings <[dict]>
+    # every speed regression (a stage's p50 or p95 slower than the baseline's by more than
+    # time_tolerance, as a fraction) and every detection change (a frame whose results for an
+    # object differ by more than pixel_tolerance) between configurations of the same name
+    findings = []
+    baseline_configs = {config["name"]: config for config in baseline["configs"]}
+
+    for config in report["configs"]:
+        base = baseline_configs.get(config["name"])
+        if base is None:
+            continue
+
+        if "error" in config or "error" in base:
+            if ("error" in config) != ("error" in base):
+                findings.append({"config": config["name"], "kind": "error", "now": "error" in config})
+            continue
+
+        for stage, summary in config["stages"].items():
+            for stat in ("p50", "p95"):
+                now, then = summary.get(stat), base["stages"].get(stage, {}).get(stat)
+                if now is not None and then and now > then * (1 + time_tolerance):
+                    findings.append({
+                        "config": config["name"], "kind": "speed", "stage": stage, "stat": stat,
+                        "baseline": then, "now": now, "change": now / then - 1
+                    })
+
+        for name, frames in config["detections"].items():
+            base_frames = base["detections"].get(name, [])
+            changed = [
+                frame_idx for frame_idx, (now, then) in enumerate(zip(frames, base_frames))
+                if not same_detections(now, then, pixel_tolerance)
+            ]
+            if changed or len(frames) != len(base_frames):
+                findings.append({
+                    "config": config["name"], "kind": "detections", "object": name,
+                    "changed_frames": len(changed), "first_changed": changed[:10]
+                })
+
+    return findings
+
+
+def same_detections(now, then, pixel_tolerance=0):
+    if len(now) != len(then):
+        return False
+    return all(
+        abs(a - b) <= pixel_tolerance
+        for now_coords, then_coords in zip(now, then)
+        for now_corner, then_corner in zip(now_coords, then_coords)
+        for a, b in zip(now_corner, then_corner)
+    )
+
+
+def save_report(report, path):
+    with open(path, 'w') as report_file:
+        json.dump(report, report_file, indent=1)
+
+
+def load_report(path):
+    with open(path) as report_file:
+        report = json.load(report_file)
+    if report.get("version") != REPORT_VERSION:
+        raise Exception("benchmark report %s is version %s, expected %d" % (path, report.get("version"), REPORT_VERSION))
+    return report
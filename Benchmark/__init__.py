@@ -0,0 +1,2 @@
+# re-exports
+from .Benchmark import Benchmark, compare, save_report, load_report, expand_matrix
\ No newline at end of file
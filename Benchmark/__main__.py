@@ -0,0 +1,95 @@
+# Replays a recording through the vision system under a matrix of options, eg.
+#   python -m Benchmark pi/data/final_countdown.mp4 --scales 1 2 --fused 0 1 --out report.json
+#   python -m Benchmark pi/data/final_countdown.mp4 --baseline report.json
+import os
+import sys
+import argparse
+from .Benchmark import Benchmark, compare, save_report, load_report, INSTRUMENTED_STAGES, DEFAULT_OPTIONS
+from VisionSystem import ExecutionModes
+from VisionSystem.DetectionModel.ThreshBlob import BlobEngines
+
+
+def relpath(*paths):
+    return os.path.join(os.path.dirname(__file__), "..", *paths)
+
+
+def scale(text):
+    # whole scales as ints, so that configs are named the same however the scale was written
+    val = float(text)
+    return int(val) if val.is_integer() else val
+
+
+def print_summary(report):
+    print("%-100s %8s %9s %9s %9s" % ("config", "fps", "p50 ms", "p95 ms", "p99 ms"))
+    for config in report["configs"]:
+        if "error" in config:
+            print("%-100s %8s" % (config["name"], "error"))
+            continue
+        frame = config["stages"]["frame"]
+        print("%-100s %8.1f %9.2f %9.2f %9.2f" % (
+            config["name"], config["fps"], frame["p50"] * 1000, frame["p95"] * 1000, frame["p99"] * 1000
+        ))
+        # and each stage of detection, per call (eg. per object for blobs)
+        for stage in INSTRUMENTED_STAGES:
+            if stage in config["stages"]:
+                stats = config["stages"][stage]
+                print("  %-98s %8s %9.3f %9.3f %9.3f" % (
+                    stage, "", stats["p50"] * 1000, stats["p95"] * 1000, stats["p99"] * 1000
+                ))
+
+
+def print_findings(findings):
+    for finding in findings:
+        if finding["kind"] == "speed":
+            print("SLOWER  %s: %s %s %.2fms -> %.2fms (%+.0f%%)" % (
+                finding["config"], finding["stage"], finding["stat"],
+                finding["baseline"] * 1000, finding["now"] * 1000, finding["change"] * 100
+            ))
+        elif finding["kind"] == "detections":
+            print("CHANGED %s: %s differs on %d frames (first: %s)" % (
+                finding["config"], finding["object"], finding["changed_frames"], finding["first_changed"]
+            ))
+        else:
+            print("ERROR   %s: %s" % (finding["config"], "now fails" if finding["now"] else "no longer fails"))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog="python -m Benchmark", description="Benchmark the vision system on a recording")
+    parser.add_argument("video_path", help="recording or frame store to replay")
+    parser.add_argument("--models-dir", default=relpath("detection_models"))
+    parser.add_argument("--frames", type=int, default=300, help="frames to time, 0 for the whole recording")
+    parser.add_argument("--warmup", type=int, default=10)
+    # options left out are run at their DEFAULT_OPTIONS values, the same as the library's
+    parser.add_argument("--scales", type=scale, nargs='+', default=[DEFAULT_OPTIONS["downsample_scale"]],
+        help="downsample scales to try")
+    parser.add_argument("--fused", type=int, nargs='+', default=[int(DEFAULT_OPTIONS["fused"])], choices=[0, 1])
+    parser.add_argument("--compiled", type=int, nargs='+', default=[int(DEFAULT_OPTIONS["compiled"])], choices=[0, 1])
+    parser.add_argument("--engines", nargs='+', default=[DEFAULT_OPTIONS["blob_engine"]],
+        choices=[engine.name for engine in BlobEngines])
+    parser.add_argument("--modes", nargs='+', default=[DEFAULT_OPTIONS["execution_mode"]],
+        choices=[mode.name for mode in ExecutionModes])
+    parser.add_argument("--out", help="where to write the JSON report")
+    parser.add_argument("--baseline", help="report to compare against")
+    parser.add_argument("--time-tolerance", type=float, default=0.1,
+        help="fraction a stage may slow down by before it is flagged")
+    parser.add_argument("--pixel-tolerance", type=int, default=0,
+        help="pixels a detection's corners may move by before it is flagged")
+    args = parser.parse_args()
+
+    benchmark = Benchmark(args.video_path, args.models_dir, frames=args.frames or None, warmup=args.warmup)
+    report = benchmark.run({
+        "downsample_scale": args.scales,
+        "fused": [bool(fused) for fused in args.fused],
+        "compiled": [bool(compiled) for compiled in args.compiled],
+        "blob_engine": args.engines,
+        "execution_mode": args.modes
+    })
+
+    print_summary(report)
+    if args.out:
+        save_report(report, args.out)
+
+    if args.baseline:
+        findings = compare(report, load_report(args.baseline), args.time_tolerance, args.pixel_tolerance)
+        print_findings(findings)
+        sys.exit(1 if findings else 0)
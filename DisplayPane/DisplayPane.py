@@ -162,10 +162,10 @@ class DisplayPane(ipy.VBox):
     
 
     def make_video_controller(self):
-        last_frame = self.video_stream.cap.get(cv2.CAP_PROP_FRAME_COUNT) - 1
+        last_frame = self.video_stream.frame_count() - 1
 
         player = ipy.Play(
-            interval=1000 / self.video_stream.cap.get(cv2.CAP_PROP_FPS),
+            interval=1000 / self.video_stream.fps(),
             max=last_frame
         )
         
@@ -113,7 +113,7 @@ class ThreshBlobTuner(DetectionModelTunerABC):
 
         def on_change_erosion_dilation(attr):
             def update(change):
-                thresh[attr] = change['new']
+                setattr(thresh, attr, change['new'])
                 self.model_display.update_data_and_display()
             return update
 
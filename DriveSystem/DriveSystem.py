@@ -1,5 +1,6 @@
 import math
-import RPi.GPIO as GPIO # Import GPIO Modual
+from Hardware import GPIO # RPi.GPIO, or a simulated stand-in off the robot
+import Instrumentation
 
 
 class DriveSystem():
@@ -8,6 +9,11 @@ class DriveSystem():
     ROTATION_VEL_2_ACC_TUNER_CONSTANT = 5
     LENGTH_CENTER_2_WHEEL = 0.08 # m
 
+    # armed <bool>
+    # whether commands drive the motors. Disarmed, they are only recorded in last_command, eg.
+    # while main.py warms up the control loop on dummy frames
+    armed = True
+
 
     def __init__(self, speed_modifier):
         self.speed_modifier = speed_modifier
@@ -25,6 +31,10 @@ class DriveSystem():
         self.UpdateMotors = False
         self.threshold = 0.1
 
+        # last_command <tuple<float, float, float>?>
+        # (velx, vely, velRot) last passed to setTargetVelocities, None until then
+        self.last_command = None
+
         GPIO.setup(self.EnableA,GPIO.OUT)
         GPIO.setup(self.EnableB,GPIO.OUT) # ENABLE
         GPIO.setup(self.EnableC,GPIO.OUT)
@@ -40,7 +50,11 @@ class DriveSystem():
         self.pwmC = GPIO.PWM(self.EnableC, 500) # Initiates PWM signal - Phase
     
 
+    @Instrumentation.instrumented("drive")
     def setTargetVelocities(self, velx, vely, velRot):
+        self.last_command = (velx, vely, velRot)
+        if not self.armed:
+            return
         V = self.SPEED_TUNER_CONSTANT * math.sqrt(math.pow(velx, 2) + math.pow(vely, 2))
         theta = math.atan2(vely, velx)
         A = self.ROTATION_VEL_2_ACC_TUNER_CONSTANT * velRot
@@ -0,0 +1,130 @@
+import os
+from enum import Enum
+from threading import Lock
+from .LazyGPIO import LazyGPIO
+from .SimulatedGPIO import SimulatedGPIO
+from .SimulatedCamera import SimulatedCamera
+
+
+
+class HardwareModes(Enum):
+
+    # the robot's own GPIO pins (RPi.GPIO)
+    Pi = 1
+
+    # SimulatedGPIO records every pin change, so that the whole loop runs (and can be profiled)
+    # on a desktop
+    Simulated = 2
+
+
+
+class CameraModes(Enum):
+
+    # a real camera: the Pi camera (picamera), or the first webcam without it, eg. for tuning
+    # live on a desktop
+    Live = 1
+
+    # SimulatedCamera plays a recording or a synthetic scene
+    Simulated = 2
+
+
+
+# The hardware the robot's subsystems drive, chosen by configuration rather than by imports:
+#   EGB320_HARDWARE=Pi|Simulated      the GPIO mode. Defaults to Pi wherever RPi.GPIO works
+#   EGB320_CAMERA=Live|Simulated      the camera mode. Defaults to Simulated when EGB320_HARDWARE
+#                                     is set to Simulated or a camera source is given, and to
+#                                     Live otherwise, so a desktop without RPi.GPIO still uses
+#                                     its webcam
+#   EGB320_CAMERA_SOURCE=<video>      recording the simulated camera plays, synthetic if unset
+#   EGB320_CAMERA_FPS=<fps>           simulated camera frame rate, 0 for as fast as it's read
+# or configure() before the hardware is first used
+
+MODE = HardwareModes[os.environ["EGB320_HARDWARE"]] if os.environ.get("EGB320_HARDWARE") else None
+CAMERA_MODE = CameraModes[os.environ["EGB320_CAMERA"]] if os.environ.get("EGB320_CAMERA") else None
+CAMERA_SOURCE = os.environ.get("EGB320_CAMERA_SOURCE") or None
+CAMERA_FPS = float(os.environ.get("EGB320_CAMERA_FPS", 30))
+
+# backend <module?>
+# RPi.GPIO or the SimulatedGPIO, once something has used it
+backend = None
+backend_lock = Lock()
+
+# mode_detected <bool>
+# whether MODE was picked by whether RPi.GPIO works rather than configured, see camera_mode()
+mode_detected = False
+
+
+
+def configure(mode=None, camera_mode=None, camera_source=None, camera_fps=None):
+    # mode <HardwareModes?>, camera_mode <CameraModes?>, camera_source <str?>, camera_fps <float?>
+    # overrides of the environment's configuration. Those left None are kept
+    global MODE, CAMERA_MODE, CAMERA_SOURCE, CAMERA_FPS, mode_detected
+    if mode is not None:
+        if backend is not None and mode is not MODE:
+            raise Exception("the hardware mode can't change once GPIO is in use")
+        MODE = mode
+        mode_detected = False
+    if camera_mode is not None:
+        CAMERA_MODE = camera_mode
+    if camera_source is not None:
+        CAMERA_SOURCE = camera_source
+    if camera_fps is not None:
+        CAMERA_FPS = camera_fps
+
+
+def mode():
+    global MODE, mode_detected
+    if MODE is None:
+        MODE = HardwareModes.Pi if import_rpi_gpio() is not None else HardwareModes.Simulated
+        mode_detected = True
+    return MODE
+
+
+def camera_mode():
+    # configured separately from the GPIO mode, so that falling back to simulated GPIO off the
+    # robot doesn't also take the webcam away
+    if CAMERA_MODE is not None:
+        return CAMERA_MODE
+    if CAMERA_SOURCE or (MODE is HardwareModes.Simulated and not mode_detected):
+        return CameraModes.Simulated
+    return CameraModes.Live
+
+
+def gpio():
+    # the RPi.GPIO module, or the SimulatedGPIO standing in for it
+    global backend
+    with backend_lock:
+        if backend is None:
+            if mode() is HardwareModes.Pi:
+                backend = import_rpi_gpio()
+                if backend is None:
+                    raise Exception("RPi.GPIO can't be used here, set EGB320_HARDWARE=Simulated to run without it")
+            else:
+                backend = SimulatedGPIO()
+        return backend
+
+
+def simulated_gpio():
+    # the SimulatedGPIO in use, None when driving the real pins
+    return gpio() if mode() is HardwareModes.Simulated else None
+
+
+def camera(resolution):
+    # the SimulatedCamera to capture from at resolution (width, height), None when a real camera
+    # should be used
+    if camera_mode() is not CameraModes.Simulated:
+        return None
+    return SimulatedCamera(CAMERA_SOURCE, CAMERA_FPS, resolution)
+
+
+def import_rpi_gpio():
+    try:
+        import RPi.GPIO
+        return RPi.GPIO
+    except Exception:
+        # not installed, or installed somewhere other than a Pi (where importing it raises)
+        return None
+
+
+
+GPIO = LazyGPIO(gpio)
@@ -0,0 +1,14 @@
+# Drop-in for the RPi.GPIO module that forwards everything to the configured backend (see
+# Hardware.gpio()), so that modules can import it before the hardware is configured, eg.
+#   from Hardware import GPIO
+#   GPIO.setup(pin, GPIO.OUT)
+class LazyGPIO():
+
+    def __init__(self, resolve):
+        # resolve <() -> module>
+        # returns the GPIO backend. Only called on first use
+        self.resolve = resolve
+
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
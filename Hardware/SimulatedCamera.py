@@ -0,0 +1,133 @@
+import cv2
+import math
+import numpy as np
+from time import perf_counter, sleep
+
+
+# colours (BGR) of the synthetic scene's field and objects
+FIELD_COLOR = (40, 110, 40)
+BALL_COLOR = (0, 110, 255)
+BLUE_GOAL_COLOR = (160, 70, 20)
+YELLOW_GOAL_COLOR = (20, 200, 220)
+
+# seconds for the synthetic ball to cross the frame and back
+BALL_PERIOD = 4
+
+
+
+# Stands in for the camera off the robot, with the interface of cv2.VideoCapture so that
+# VideoStream's live capture path runs unchanged. Frames come from a recording (looped) or a
+# synthetic scene of a ball rolling in front of the goals, at the given resolution and paced to
+# the given frame rate, as the Pi camera would deliver them
+class SimulatedCamera():
+
+    def __init__(self, source=None, fps=30, resolution=(640, 480), loop=True):
+        # source <str?>
+        # recording to play, None for the synthetic scene
+        self.source = source
+
+        # fps <float?>
+        # frames delivered per second. None (or 0) delivers them as fast as they are read, eg. to
+        # find the most the rest of the loop can keep up with
+        self.fps = fps
+
+        # resolution <tuple<int, int>>
+        # (width, height) of the frames delivered. Recordings are resized to it
+        self.resolution = tuple(resolution)
+        self.loop = loop
+
+        # frames <int>, late_frames <int>
+        # frames delivered, and how many of them were read more than a frame late, ie. the reader
+        # couldn't keep up with the frame rate
+        self.frames = 0
+        self.late_frames = 0
+
+        self.cap = cv2.VideoCapture(source) if source else None
+        if self.cap is not None and not self.cap.isOpened():
+            raise Exception("simulated camera can't open %s" % source)
+        self.started_at = None
+
+
+    def isOpened(self):
+        return True
+
+
+    def read(self, image=None):
+        self.wait_for_frame()
+
+        if self.cap is not None:
+            ok, recorded = self.cap.read()
+            if not ok and self.loop:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, recorded = self.cap.read()
+            if not ok:
+                return False, image
+            if image is None or image.shape[1::-1] != self.resolution:
+                image = np.empty((self.resolution[1], self.resolution[0], 3), dtype=np.uint8)
+            if recorded.shape[1::-1] == self.resolution:
+                np.copyto(image, recorded)
+            else:
+                cv2.resize(recorded, self.resolution, dst=image)
+        else:
+            image = self.synthetic_frame(image)
+
+        self.frames += 1
+        return True, image
+
+
+    def wait_for_frame(self):
+        now = perf_counter()
+        if self.started_at is None:
+            self.started_at = now
+        if not self.fps:
+            return
+
+        due = self.started_at + self.frames / self.fps
+        if now < due:
+            sleep(due - now)
+        elif now - due > 1 / self.fps:
+            self.late_frames += 1
+
+
+    def synthetic_frame(self, image=None):
+        width, height = self.resolution
+        if image is None or image.shape[1::-1] != self.resolution:
+            image = np.empty((height, width, 3), dtype=np.uint8)
+        image[:] = FIELD_COLOR
+
+        goal_size = (width // 4, height // 8)
+        cv2.rectangle(image, (width // 16, height // 8), (width // 16 + goal_size[0], height // 8 + goal_size[1]),
+            BLUE_GOAL_COLOR, -1)
+        cv2.rectangle(image, (width - width // 16 - goal_size[0], height // 8), (width - width // 16, height // 8 + goal_size[1]),
+            YELLOW_GOAL_COLOR, -1)
+
+        # the ball rolls from side to side across the lower half of the frame, as a ball does when
+        # the robot turns to search for it
+        elapsed = self.frames / self.fps if self.fps else self.frames / 30
+        phase = math.sin(2 * math.pi * elapsed / BALL_PERIOD)
+        radius = max(2, height // 16)
+        center = (int(width / 2 + phase * (width / 2 - radius * 2)), int(height * 0.7))
+        cv2.circle(image, center, radius, BALL_COLOR, -1)
+        return image
+
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.resolution[0]
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.resolution[1]
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps or 0
+        if self.cap is not None:
+            return self.cap.get(prop)
+        return 0
+
+
+    def set(self, prop, value):
+        # the resolution and frame rate are fixed when the camera is made
+        return False
+
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
@@ -0,0 +1,126 @@
+from collections import deque
+from threading import Lock
+from time import perf_counter
+from .SimulatedPWM import SimulatedPWM
+
+
+
+# Stands in for the RPi.GPIO module off the robot, recording every pin change and PWM duty cycle
+# with the perf_counter() time it happened, so that runs on a desktop can tell how often (and how)
+# the actuators would have been driven. Only the parts of RPi.GPIO the robot uses are provided
+class SimulatedGPIO():
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    HIGH = 1
+    LOW = 0
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+
+    def __init__(self, max_events=100000):
+        # events <deque<tuple<float, int, str, float>>>
+        # (timestamp, pin, kind, value) of the latest max_events changes, where kind is one of
+        # "setup", "output", "duty", "frequency" or "stop"
+        self.events = deque(maxlen=max_events)
+
+        # counts <dict<key=tuple<int, str>, val=int>>
+        # number of events of each (pin, kind) since the last reset(), however many were kept
+        self.counts = {}
+
+        # pin_values <dict<key=int, val=float>>
+        # last output level of each pin, or duty cycle of each PWM pin
+        self.pin_values = {}
+
+        self.mode = None
+        self.warnings = True
+        self.started_at = perf_counter()
+        self.lock = Lock()
+
+
+    def record(self, pin, kind, value=None):
+        with self.lock:
+            self.events.append((perf_counter(), pin, kind, value))
+            self.counts[(pin, kind)] = self.counts.get((pin, kind), 0) + 1
+            if kind in ("output", "duty"):
+                self.pin_values[pin] = value
+            elif kind == "stop":
+                self.pin_values[pin] = 0
+
+
+    def setmode(self, mode):
+        self.mode = mode
+
+
+    def getmode(self):
+        return self.mode
+
+
+    def setwarnings(self, warnings):
+        self.warnings = warnings
+
+
+    def setup(self, channels, direction, initial=None, pull_up_down=None):
+        if self.mode is None:
+            raise Exception("set the GPIO pin numbering with setmode() before setting up pins")
+        for channel in as_list(channels):
+            self.record(channel, "setup", direction)
+            if initial is not None:
+                self.record(channel, "output", initial)
+
+
+    def output(self, channels, values):
+        channels = as_list(channels)
+        values = as_list(values) if type(values) in (list, tuple) else [values] * len(channels)
+        for channel, value in zip(channels, values):
+            self.record(channel, "output", int(bool(value)))
+
+
+    def input(self, channel):
+        return self.pin_values.get(channel, self.LOW)
+
+
+    def PWM(self, channel, frequency):
+        return SimulatedPWM(self, channel, frequency)
+
+
+    def cleanup(self, channels=None):
+        with self.lock:
+            for channel in (list(self.pin_values) if channels is None else as_list(channels)):
+                self.pin_values.pop(channel, None)
+
+
+    def stats(self):
+        # stats <dict<key=int, val=dict<key=str, val=dict>>>
+        # for each pin and kind of event, how many there were and how many per second
+        with self.lock:
+            elapsed = perf_counter() - self.started_at
+            counts = dict(self.counts)
+
+        stats = {}
+        for (pin, kind), count in sorted(counts.items()):
+            stats.setdefault(pin, {})[kind] = {"count": count, "per_second": count / elapsed if elapsed else 0}
+        return stats
+
+
+    def report(self):
+        # stats() as a table
+        lines = ["%4s %-10s %8s %10s" % ("pin", "event", "count", "per sec")]
+        for pin, kinds in self.stats().items():
+            for kind, kind_stats in kinds.items():
+                lines.append("%4d %-10s %8d %10.1f" % (pin, kind, kind_stats["count"], kind_stats["per_second"]))
+        return "\n".join(lines)
+
+
+    def reset(self):
+        with self.lock:
+            self.events.clear()
+            self.counts = {}
+            self.started_at = perf_counter()
+
+
+
+def as_list(channels):
+    return list(channels) if type(channels) in (list, tuple) else [channels]
@@ -0,0 +1,33 @@
+# Stands in for RPi.GPIO.PWM, recording each change to the output with its SimulatedGPIO
+class SimulatedPWM():
+
+    def __init__(self, gpio, channel, frequency):
+        # gpio <SimulatedGPIO>
+        # records this output's changes
+        self.gpio = gpio
+        self.channel = channel
+        self.frequency = frequency
+
+        # duty_cycle <float?>
+        # percentage of each period the pin is high, None while stopped
+        self.duty_cycle = None
+        gpio.record(channel, "frequency", frequency)
+
+
+    def start(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+        self.gpio.record(self.channel, "duty", duty_cycle)
+
+
+    def ChangeDutyCycle(self, duty_cycle):
+        self.start(duty_cycle)
+
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+        self.gpio.record(self.channel, "frequency", frequency)
+
+
+    def stop(self):
+        self.duty_cycle = None
+        self.gpio.record(self.channel, "stop")
@@ -0,0 +1,6 @@
+# re-exports
+from .Hardware import HardwareModes, CameraModes, GPIO, configure, mode, camera_mode, gpio, simulated_gpio, camera
+from .SimulatedGPIO import SimulatedGPIO
+from .SimulatedPWM import SimulatedPWM
+from .SimulatedCamera import SimulatedCamera
+from .LazyGPIO import LazyGPIO
\ No newline at end of file
@@ -0,0 +1,100 @@
+import math
+from threading import Lock
+
+
+# bins are spaced logarithmically, BINS_PER_DECADE to every factor of 10, from MIN_SECONDS up to
+# MAX_SECONDS. Each bin is ~12% wide, so percentiles are good to within ~6%
+MIN_SECONDS = 1e-6
+MAX_SECONDS = 10
+BINS_PER_DECADE = 20
+NUM_BINS = int(round(math.log10(MAX_SECONDS / MIN_SECONDS) * BINS_PER_DECADE))
+
+
+
+# Fixed-size histogram of durations, so that recording one is cheap and takes no more memory
+# however long the robot runs. Durations under MIN_SECONDS or over MAX_SECONDS are counted in
+# the first or last bin
+class Histogram():
+
+    def __init__(self):
+        # counts <[int]>
+        # number of durations recorded in each bin, see bin_edges()
+        self.counts = [0] * NUM_BINS
+
+        # count <int>, total <float>, min <float?>, max <float?>
+        # exact totals of every duration recorded
+        self.count = 0
+        self.total = 0.
+        self.min = None
+        self.max = None
+
+        self.lock = Lock()
+
+
+    def record(self, seconds):
+        if seconds <= MIN_SECONDS:
+            bin_idx = 0
+        else:
+            bin_idx = min(NUM_BINS - 1, int(math.log10(seconds / MIN_SECONDS) * BINS_PER_DECADE))
+
+        with self.lock:
+            self.counts[bin_idx] += 1
+            self.count += 1
+            self.total += seconds
+            if self.min is None or seconds < self.min:
+                self.min = seconds
+            if self.max is None or seconds > self.max:
+                self.max = seconds
+
+
+    def percentile(self, percentile):
+        # estimated duration that percentile (0 to 100) of those recorded were shorter than, as the
+        # geometric middle of the bin it falls in. None if nothing has been recorded
+        with self.lock:
+            counts, count, low, high = list(self.counts), self.count, self.min, self.max
+        if not count:
+            return None
+
+        rank = percentile / 100 * count
+        seen = 0
+        for bin_idx, bin_count in enumerate(counts):
+            seen += bin_count
+            if bin_count and seen >= rank:
+                break
+
+        bin_low, bin_high = bin_edges(bin_idx)
+        return min(high, max(low, math.sqrt(bin_low * bin_high)))
+
+
+    def stats(self, percentiles=(50, 95, 99)):
+        with self.lock:
+            count, total, low, high = self.count, self.total, self.min, self.max
+
+        stats = {
+            "count": count,
+            "total": total,
+            "mean": total / count if count else None,
+            "min": low,
+            "max": high
+        }
+        for percentile in percentiles:
+            stats["p%g" % percentile] = self.percentile(percentile)
+        return stats
+
+
+    def reset(self):
+        with self.lock:
+            self.counts = [0] * NUM_BINS
+            self.count = 0
+            self.total = 0.
+            self.min = None
+            self.max = None
+
+
+
+def bin_edges(bin_idx):
+    # (lowest, highest) seconds counted in a bin
+    return (
+        MIN_SECONDS * 10 ** (bin_idx / BINS_PER_DECADE),
+        MIN_SECONDS * 10 ** ((bin_idx + 1) / BINS_PER_DECADE)
+    )
@@ -0,0 +1,109 @@
+import os
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+from .Histogram import Histogram
+
+
+# Low-overhead timing of the robot's hot paths (capture, colour conversion, thresholding,
+# morphology, blob extraction, geometry, navigation and driving), so that field runs can tell
+# where the time goes without a profiler distorting it. Off by default, in which case each timed
+# section costs a function call and a check of a flag. Durations go into a fixed-size Histogram
+# per stage, queryable through stats() or report().
+#
+# Timed sections look like
+#   start = Instrumentation.start()
+#   ...
+#   Instrumentation.stop("stage", start)
+# or use the instrumented("stage") decorator for whole functions. Stages can nest, eg. "threshold"
+# includes any "convert" it needed.
+#
+# Only the process that recorded a duration sees it, so stages run in the VisionSystem's worker
+# processes aren't counted (their overall time still is, see VisionSystem.object_timings)
+
+
+# set EGB320_INSTRUMENT=1 to have instrumentation on from the start
+ENABLED = os.environ.get("EGB320_INSTRUMENT", "0") not in ("", "0")
+
+# histograms <dict<key=str, val=Histogram>>
+# durations of each stage recorded so far
+histograms = {}
+histograms_lock = Lock()
+
+
+
+def enable(enabled=True):
+    global ENABLED
+    ENABLED = enabled
+
+
+def disable():
+    enable(False)
+
+
+def is_enabled():
+    return ENABLED
+
+
+def start():
+    # start of a timed section, None if instrumentation is off
+    return perf_counter() if ENABLED else None
+
+
+def stop(stage, start):
+    # ends a timed section begun by start(), recording its duration against stage
+    if start is not None:
+        record(stage, perf_counter() - start)
+
+
+def record(stage, seconds):
+    histogram = histograms.get(stage)
+    if histogram is None:
+        with histograms_lock:
+            histogram = histograms.setdefault(stage, Histogram())
+    histogram.record(seconds)
+
+
+def instrumented(stage):
+    # decorates a function so that each call is timed as stage
+    def decorator(function):
+        @wraps(function)
+        def timed(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(stage, perf_counter() - start)
+        return timed
+    return decorator
+
+
+def stats(percentiles=(50, 95, 99)):
+    # stats <dict<key=str, val=dict>>
+    # count, total, mean, min, max and the given percentiles (eg. "p95") in seconds of every
+    # stage recorded so far
+    with histograms_lock:
+        stages = list(histograms.items())
+    return {stage: histogram.stats(percentiles) for stage, histogram in sorted(stages)}
+
+
+def histogram(stage):
+    # the Histogram of a stage, None if it hasn't been recorded
+    return histograms.get(stage)
+
+
+def reset():
+    with histograms_lock:
+        histograms.clear()
+
+
+def report(percentiles=(50, 95, 99)):
+    # stats() as a table, in milliseconds
+    columns = ["p%g" % percentile for percentile in percentiles]
+    lines = ["%-18s %8s %9s" % ("stage", "count", "mean") + "".join(" %9s" % column for column in columns)]
+    for stage, stage_stats in stats(percentiles).items():
+        lines.append("%-18s %8d %9.3f" % (stage, stage_stats["count"], stage_stats["mean"] * 1000) +
+            "".join(" %9.3f" % (stage_stats[column] * 1000) for column in columns))
+    return "\n".join(lines)
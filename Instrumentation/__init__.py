@@ -0,0 +1,3 @@
+# re-exports
+from .Histogram import Histogram
+from .Instrumentation import enable, disable, is_enabled, start, stop, record, instrumented, stats, histogram, reset, report
\ No newline at end of file
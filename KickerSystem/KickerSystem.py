@@ -1,4 +1,4 @@
-import RPi.GPIO as GPIO
+from Hardware import GPIO
 import time
 
 
@@ -6,6 +6,10 @@ class KickerSystem():
 
     KICK_SLEEP = 0.15 # seconds after kicking before resuming function
 
+    # armed <bool>
+    # whether to drive the dribbler and kicker at all, see DriveSystem.armed
+    armed = True
+
     def __init__(self):
         self.DribDIR = 21
         self.DribENA = 20
@@ -18,13 +22,17 @@ class KickerSystem():
         self.pwmDRIB = GPIO.PWM(self.DribENA, 500)
     
     def start_dribbling(self):
-        self.pwmDRIB.start(90)
+        if self.armed:
+            self.pwmDRIB.start(90)
 
     
     def stop_dribbling(self):
-        self.pwmDRIB.start(0)
+        if self.armed:
+            self.pwmDRIB.start(0)
 
     def kick(self):
+        if not self.armed:
+            return
         GPIO.output(self.KICKER_PIN, GPIO.HIGH)
         time.sleep(self.KICK_SLEEP)
         GPIO.output(self.KICKER_PIN, GPIO.LOW)
\ No newline at end of file
@@ -1,9 +1,34 @@
 import numpy as np
 import math
+from time import perf_counter
+from enum import Enum
+import Instrumentation
+
+
+
+class NavStates(Enum):
+
+    # the ball can't be seen, so the robot turns on the spot looking for it
+    SearchingForBall = 1
+
+    # the ball can be seen, and the robot is driving to it
+    ChasingBall = 2
+
+    # the ball is in the dribbler, and the robot is taking it to the goal
+    DribblingToGoal = 3
+
 
 
 class NavigationSystem():
 
+    # how much each object matters to the vision system in each state, see DetectionScheduler.
+    # the ball is still checked while dribbling, so that losing it is noticed
+    STATE_PRIORITIES = {
+        NavStates.SearchingForBall: {"ball": 1, "blue_goal": 0.5, "yellow_goal": 0.25, "obstacle": 0.5},
+        NavStates.ChasingBall: {"ball": 1, "blue_goal": 0.25, "yellow_goal": 0.25, "obstacle": 1},
+        NavStates.DribblingToGoal: {"ball": 0.5, "blue_goal": 1, "yellow_goal": 0.25, "obstacle": 1}
+    }
+
     GOAL_P = 0.5
     MAX_ROBOT_ROT = 1
     MAX_ROBOT_VEL = 0.05
@@ -12,17 +37,37 @@ class NavigationSystem():
     def __init__(self, vision_system, drive_system, kicker_dribbler, debug_print):
         self.vision_system = vision_system
         self.drive_system = drive_system
+        self.kicker_dribbler = kicker_dribbler
+        self.debug_print = debug_print
+        self.reset()
+
+
+    def reset(self):
+        # forgets everything learnt from past updates, eg. after warming up on dummy frames
         self.headingRad = 0
         self.goal_found = False
         self.lastHeading = 0.4
-        self.kicker_dribbler = kicker_dribbler
-        self.debug_print = debug_print
+
+        # state <NavStates?>
+        # what the robot is doing, as of the last update()
+        self.state = None
 
 
-    def update(self):
-        ballRB, blueRB, yellowRB, obstaclesRB = self.get_vision_results_vrep_format()
+    @Instrumentation.instrumented("navigation")
+    def update(self, vision_snapshot=None, timestamp=None):
+        # vision_snapshot: results to act on, as returned by VisionSystem.snapshot().
+        # Defaults to the vision system's current results
+        # timestamp: perf_counter() time to estimate the objects' positions at. Defaults to now
+        ballRB, blueRB, yellowRB, obstaclesRB = self.get_vision_results_vrep_format(vision_snapshot, timestamp)
         BALL_IN_DRIBBLER_RB = (0.03, 0.3)
-        ball_in_dribbler = ballRB and ballRB[0] < BALL_IN_DRIBBLER_RB and abs(ballRB) < BALL_IN_DRIBBLER_RB[1]
+        ball_in_dribbler = ballRB and ballRB[0] < BALL_IN_DRIBBLER_RB[0] and abs(ballRB[1]) < BALL_IN_DRIBBLER_RB[1]
+
+        if ball_in_dribbler:
+            self.set_state(NavStates.DribblingToGoal)
+        elif ballRB == None:
+            self.set_state(NavStates.SearchingForBall)
+        else:
+            self.set_state(NavStates.ChasingBall)
 
         # perform PID control on the drive system#check to see if ball is in dribbler
         if ball_in_dribbler: # soccerBotSim.BallInDribbler() == True:
@@ -88,8 +133,25 @@ class NavigationSystem():
                     self.drive_system.setTargetVelocities(desired_vel, 0, desired_rot_vel)
 
 
-    def get_vision_results_vrep_format(self):
-        objs = self.vision_system.objects_to_track # for shorthand
+    def set_state(self, state):
+        # tells the vision system which objects matter whenever the state changes
+        if state is not self.state:
+            self.state = state
+            self.vision_system.set_priorities(self.STATE_PRIORITIES[state])
+
+
+    def get_vision_results_vrep_format(self, vision_snapshot=None, timestamp=None):
+        snapshot = vision_snapshot or self.vision_system.snapshot()
+        timestamp = perf_counter() if timestamp is None else timestamp
+
+        def bearings_distances(name, multi=False):
+            # single objects are estimated from their recent detections, so a missed or skipped
+            # frame doesn't lose them. Multiple objects (obstacles) use the latest detections
+            detections, estimator = snapshot[name][1], snapshot[name][2]
+            if multi or estimator is None:
+                return detections
+            estimate = estimator.estimate(timestamp)
+            return [estimate] if estimate is not None else []
 
         def vrep_format(bearings_distances, multi=False):
             if any(bearings_distances):
@@ -101,10 +163,10 @@ class NavigationSystem():
                 return None
 
         return (
-            vrep_format(objs["ball"].bearings_distances),
-            vrep_format(objs["blue_goal"].bearings_distances),
-            vrep_format(objs["yellow_goal"].bearings_distances),
-            vrep_format(objs["obstacle"].bearings_distances, multi=True),
+            vrep_format(bearings_distances("ball")),
+            vrep_format(bearings_distances("blue_goal")),
+            vrep_format(bearings_distances("yellow_goal")),
+            vrep_format(bearings_distances("obstacle", multi=True), multi=True),
         )
 
         
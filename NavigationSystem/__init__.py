@@ -1 +1 @@
-from .NavigationSystem import NavigationSystem
\ No newline at end of file
+from .NavigationSystem import NavigationSystem, NavStates
\ No newline at end of file
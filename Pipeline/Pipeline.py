@@ -0,0 +1,216 @@
+from threading import Thread, Condition, Event
+from collections import deque
+from enum import Enum
+from time import perf_counter
+
+
+
+class QueuePolicies(Enum):
+
+    # the producer waits until there is room in the queue
+    Block = 1
+
+    # the oldest queued item is discarded to make room for the new one
+    DropOldest = 2
+
+    # the queue only ever holds the newest item, which replaces anything not yet consumed
+    LatestOnly = 3
+
+
+
+class QueueClosed(Exception):
+    pass
+
+
+
+class BoundedQueue():
+
+    def __init__(self, maxsize=1, policy=QueuePolicies.Block, on_drop=None):
+        # maxsize <int>
+        # the number of items the queue can hold before its policy kicks in
+        self.maxsize = 1 if policy is QueuePolicies.LatestOnly else maxsize
+
+        # policy <QueuePolicies>
+        # what to do when an item is put into a full queue
+        self.policy = policy
+
+        # on_drop <(item) -> None>
+        # called with every item discarded by the policy, eg. to release its buffers
+        self.on_drop = on_drop
+
+        # dropped <int>
+        # the number of items discarded by the policy so far
+        self.dropped = 0
+
+        self.items = deque()
+        self.cond = Condition()
+        self.closed = False
+
+
+    def put(self, item):
+        dropped = None
+        with self.cond:
+            if self.policy is QueuePolicies.Block:
+                while len(self.items) >= self.maxsize and not self.closed:
+                    self.cond.wait()
+            elif len(self.items) >= self.maxsize:
+                dropped = self.items.popleft()
+                self.dropped += 1
+
+            if self.closed:
+                raise QueueClosed()
+
+            self.items.append(item)
+            self.cond.notify_all()
+
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+
+
+    def get(self):
+        # blocks until there is an item. Once the queue is closed, the remaining items are
+        # still handed out before QueueClosed is raised
+        with self.cond:
+            while not self.items and not self.closed:
+                self.cond.wait()
+            if not self.items:
+                raise QueueClosed()
+
+            item = self.items.popleft()
+            self.cond.notify_all()
+            return item
+
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+    def __len__(self):
+        return len(self.items)
+
+
+
+class Stage():
+
+    def __init__(self, name, fn, policy=QueuePolicies.Block, maxsize=2):
+        # name <str>
+        # name of this stage for stats purposes
+        self.name = name
+
+        # fn <(item) -> item?>
+        # the work done by this stage. The first stage of a pipeline is a source, called with
+        # no arguments until it raises StopIteration. Every other stage is called with each item
+        # produced by the stage before it. Returning None passes nothing on to the next stage
+        self.fn = fn
+
+        # policy <QueuePolicies>, maxsize <int>
+        # the policy and size of the queue feeding this stage
+        self.policy = policy
+        self.maxsize = maxsize
+
+        self.processed = 0
+        self.busy_time = 0
+
+
+
+class Pipeline():
+
+    # runs each stage on its own thread, connected by bounded queues, so that the stages overlap
+    # and throughput is limited by the slowest stage rather than the sum of all of them.
+    # threads rather than processes, as the robot's stages share (and mutate) the same subsystem
+    # objects. OpenCV, video encoding and camera capture all release the GIL while they work
+
+    def __init__(self, stages, on_drop=None):
+        # stages <[Stage]>
+        # in order, the first being the source
+        self.stages = stages
+
+        # queues <[BoundedQueue]>
+        # queues[i] feeds stages[i + 1]
+        self.queues = [BoundedQueue(stage.maxsize, stage.policy, on_drop=on_drop) for stage in stages[1:]]
+
+        self.stop_event = Event()
+        self.threads = []
+        self.error = None
+
+
+    def start(self):
+        self.threads = [
+            Thread(target=self.run_stage, args=(idx,), name=stage.name, daemon=True)
+            for idx, stage in enumerate(self.stages)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+
+    def run_stage(self, idx):
+        stage = self.stages[idx]
+        in_queue = self.queues[idx - 1] if idx > 0 else None
+        out_queue = self.queues[idx] if idx < len(self.queues) else None
+
+        try:
+            while not self.stop_event.is_set():
+                if in_queue is None:
+                    start = perf_counter()
+                    item = stage.fn()
+                else:
+                    item = in_queue.get()
+                    start = perf_counter()
+                    item = stage.fn(item)
+
+                stage.busy_time += perf_counter() - start
+                stage.processed += 1
+
+                if item is not None and out_queue is not None:
+                    out_queue.put(item)
+
+        except (StopIteration, QueueClosed):
+            pass # the stage before this one finished, or the pipeline was stopped
+
+        except BaseException as e:
+            if self.error is None:
+                self.error = e
+            self.stop()
+
+        finally:
+            # let the next stage drain what is left, then finish
+            if out_queue is not None:
+                out_queue.close()
+
+
+    def stop(self):
+        self.stop_event.set()
+        for queue in self.queues:
+            queue.close()
+
+
+    def join(self, poll_interval=0.1):
+        # waits for every stage to finish, re-raising the first error any of them hit.
+        # polls so that a KeyboardInterrupt still reaches the main thread
+        for thread in self.threads:
+            while thread.is_alive():
+                thread.join(poll_interval)
+
+        if self.error is not None:
+            raise self.error
+
+
+    def run(self):
+        self.start()
+        try:
+            self.join()
+        finally:
+            self.stop()
+
+
+    def stats(self):
+        return {
+            stage.name: {
+                "processed": stage.processed,
+                "busy_time": stage.busy_time,
+                "queued": len(self.queues[idx - 1]) if idx > 0 else 0,
+                "dropped": self.queues[idx - 1].dropped if idx > 0 else 0
+            } for idx, stage in enumerate(self.stages)
+        }
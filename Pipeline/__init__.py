@@ -0,0 +1,2 @@
+# re-exports
+from .Pipeline import Pipeline, Stage, BoundedQueue, QueuePolicies, QueueClosed
\ No newline at end of file
@@ -0,0 +1,163 @@
+import os
+import json
+import pstats
+
+
+RESULT_VERSION = 1
+
+# cProfile's call graph is unrolled into stacks no deeper than this, and parts of it worth less
+# than MIN_STACK_SECONDS are left out, so that recursive code can't blow it up
+MAX_STACK_DEPTH = 64
+MIN_STACK_SECONDS = 1e-6
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+
+# What a profiled run spent its time on, from either profiler, in a form that can be saved,
+# exported for flamegraphs and diffed against another run
+class ProfileResult():
+
+    def __init__(self, mode, duration, functions=None, stacks=None):
+        # mode <str>
+        # name of the ProfilerModes member that made this result
+        self.mode = mode
+
+        # duration <float>
+        # wall-clock seconds the profiler ran for
+        self.duration = duration
+
+        # functions <dict<key=str, val=dict>>
+        # for each function (named "file:line(name)"), the seconds spent in the function itself
+        # ("self") and including what it called ("total"), and the number of calls ("calls"),
+        # which is None when sampled
+        self.functions = functions or {}
+
+        # stacks <dict<key=str, val=float>>
+        # seconds spent in each call stack, outermost function first, separated by ";"
+        self.stacks = stacks or {}
+
+
+    def top(self, count=25, sort="total"):
+        # the count functions with the most "self" or "total" time, as (name, stats) pairs
+        return sorted(self.functions.items(), key=lambda item: -item[1][sort])[:count]
+
+
+    def collapsed(self):
+        # lines of "stack weight" in the collapsed stack format read by flamegraph.pl, speedscope
+        # and similar tools. Weights are microseconds, as they have to be integers
+        return [
+            "%s %d" % (stack, round(seconds * 1e6))
+            for stack, seconds in sorted(self.stacks.items())
+            if round(seconds * 1e6) > 0
+        ]
+
+
+    def save_collapsed(self, path):
+        with open(path, 'w') as collapsed_file:
+            collapsed_file.write("\n".join(self.collapsed()) + "\n")
+
+
+    def save(self, path):
+        with open(path, 'w') as result_file:
+            json.dump({
+                "version": RESULT_VERSION,
+                "mode": self.mode,
+                "duration": self.duration,
+                "functions": self.functions,
+                "stacks": self.stacks
+            }, result_file, indent=1)
+
+
+    @staticmethod
+    def load(path):
+        # loads a result saved by save(), or a raw cProfile / pstats dump (eg. the old *.pfres files)
+        try:
+            with open(path) as result_file:
+                data = json.load(result_file)
+        except (UnicodeDecodeError, ValueError):
+            return ProfileResult.from_pstats(pstats.Stats(path))
+
+        if data.get("version") != RESULT_VERSION:
+            raise Exception("profile result %s is version %s, expected %d" % (path, data.get("version"), RESULT_VERSION))
+        return ProfileResult(data["mode"], data["duration"], data["functions"], data["stacks"])
+
+
+    @staticmethod
+    def from_pstats(stats, duration=None):
+        # stats <pstats.Stats>
+        # a cProfile run. Its call graph only has one level of callers, so its stacks are
+        # reconstructed by splitting each function's time between its callers in proportion to
+        # the time each caller spent in it
+        raw = stats.stats
+        functions = {}
+        for func, (_, calls, self_time, total_time, _) in raw.items():
+            functions[function_name(func)] = {"calls": calls, "self": self_time, "total": total_time}
+
+        callees = {}
+        for func, (_, _, _, _, callers) in raw.items():
+            for caller, (_, _, _, edge_total) in callers.items():
+                callees.setdefault(caller, []).append((func, edge_total))
+
+        stacks = {}
+
+        def unroll(func, prefix, fraction, depth, stack_funcs):
+            # stack_funcs: the functions already on this stack
+            _, _, self_time, total_time, _ = raw[func]
+            stack = prefix + [function_name(func)]
+            if self_time * fraction >= MIN_STACK_SECONDS:
+                key = ";".join(stack)
+                stacks[key] = stacks.get(key, 0) + self_time * fraction
+            if depth >= MAX_STACK_DEPTH:
+                return
+            for callee, edge_total in callees.get(func, []):
+                callee_total = raw[callee][3]
+                # recursion is cut off where it first repeats, its time counted as the caller's own
+                if callee in stack_funcs or not callee_total:
+                    continue
+                callee_fraction = fraction * edge_total / callee_total
+                if callee_total * callee_fraction >= MIN_STACK_SECONDS:
+                    stack_funcs.add(callee)
+                    unroll(callee, stack, callee_fraction, depth + 1, stack_funcs)
+                    stack_funcs.discard(callee)
+
+        for func, (_, _, _, _, callers) in raw.items():
+            if not callers:
+                unroll(func, [], 1, 1, {func})
+
+        if duration is None:
+            duration = stats.total_tt
+        return ProfileResult("CProfile", duration, functions, stacks)
+
+
+
+def function_name(func):
+    # "file:line(name)" for a (file, line, name) tuple as used by pstats, with files in this repo
+    # relative to it so that runs on different machines diff cleanly
+    filename, line, name = func
+    if filename.startswith(ROOT_DIR + os.sep):
+        filename = os.path.relpath(filename, ROOT_DIR)
+    if filename == "~":
+        # builtins, eg. "<built-in method cv2.cvtColor>"
+        return name
+    return "%s:%d(%s)" % (filename, line, name)
+
+
+def diff(before, after):
+    # rows <[dict]>
+    # each function's self time, total time and calls in both results and the change in each,
+    # the biggest changes in total time first. Calls are None when either result was sampled
+    rows = []
+    for name in set(before.functions) | set(after.functions):
+        then = before.functions.get(name, {"calls": 0, "self": 0, "total": 0})
+        now = after.functions.get(name, {"calls": 0, "self": 0, "total": 0})
+        calls_delta = None
+        if then["calls"] is not None and now["calls"] is not None:
+            calls_delta = now["calls"] - then["calls"]
+        rows.append({
+            "function": name,
+            "self_before": then["self"], "self_after": now["self"], "self_delta": now["self"] - then["self"],
+            "total_before": then["total"], "total_after": now["total"], "total_delta": now["total"] - then["total"],
+            "calls_before": then["calls"], "calls_after": now["calls"], "calls_delta": calls_delta
+        })
+    return sorted(rows, key=lambda row: -abs(row["total_delta"]))
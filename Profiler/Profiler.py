@@ -0,0 +1,82 @@
+import cProfile
+import pstats
+from enum import Enum
+from time import perf_counter
+from .SamplingProfiler import SamplingProfiler
+from .ProfileResult import ProfileResult
+
+
+
+class ProfilerModes(Enum):
+
+    # cProfile: every call of every function, in the thread that started profiling only. Exact
+    # call counts, but the per-call overhead inflates small functions' times
+    CProfile = 1
+
+    # SamplingProfiler: every thread's stack every interval. Little overhead, no call counts
+    Sampling = 2
+
+
+
+# Profiles a stretch of code with either profiler, eg.
+#   with Profiler(ProfilerModes.Sampling) as profiler:
+#       ...
+#   profiler.result().save_collapsed("run.folded")
+class Profiler():
+
+    def __init__(self, mode=ProfilerModes.Sampling, interval=0.001):
+        # mode <ProfilerModes>
+        self.mode = mode
+
+        # interval <float>
+        # seconds between samples in Sampling mode
+        self.interval = interval
+
+        self.profiler = None
+        self.started_at = None
+        self._result = None
+
+
+    def start(self):
+        self._result = None
+        self.started_at = perf_counter()
+        if self.mode is ProfilerModes.CProfile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.profiler = SamplingProfiler(self.interval)
+            self.profiler.start()
+
+
+    def stop(self):
+        if self.mode is ProfilerModes.CProfile:
+            self.profiler.disable()
+            self._result = ProfileResult.from_pstats(pstats.Stats(self.profiler), perf_counter() - self.started_at)
+        else:
+            self.profiler.stop()
+            self._result = self.profiler.result()
+        return self._result
+
+
+    def result(self):
+        # ProfileResult of the last start() to stop(), None until stopped
+        return self._result
+
+
+    def run(self, function, *args, **kwargs):
+        # profiles a call of function, returning what it returns. The profile is kept even if
+        # it raises (eg. a KeyboardInterrupt to end the main loop)
+        self.start()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.stop()
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,90 @@
+import sys
+import threading
+from time import perf_counter, sleep
+from .ProfileResult import ProfileResult, function_name
+
+
+
+# Samples the call stack of every thread at a fixed interval from a background thread, so that
+# profiled code runs at close to full speed (unlike under cProfile, which hooks every call and
+# inflates the cost of small functions). Each sample is weighted by the time since the last, so
+# times are wall-clock, including time threads spend waiting. Stacks are rooted at their thread's
+# name, so pipeline stages show up separately. The sampler needs the GIL, so while Python code
+# holds it samples come at most every sys.getswitchinterval() (5ms by default), which the
+# weighting accounts for
+class SamplingProfiler():
+
+    def __init__(self, interval=0.001):
+        # interval <float>
+        # seconds between samples
+        self.interval = interval
+
+        # samples <int>
+        # number of samples taken
+        self.samples = 0
+
+        self.stacks = {}
+        self.functions = {}
+        self.thread = None
+        self.stopped = threading.Event()
+        self.started_at = None
+        self.duration = 0
+
+
+    def start(self):
+        self.stopped.clear()
+        self.started_at = perf_counter()
+        self.thread = threading.Thread(target=self.sample_until_stopped, name="SamplingProfiler", daemon=True)
+        self.thread.start()
+
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.duration += perf_counter() - self.started_at
+
+
+    def sample_until_stopped(self):
+        own_id = threading.get_ident()
+        last = perf_counter()
+        while not self.stopped.is_set():
+            sleep(self.interval)
+            now = perf_counter()
+            self.sample(now - last, own_id)
+            last = now
+
+
+    def sample(self, weight, own_id):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(function_name((code.co_filename, code.co_firstlineno, code.co_name)))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, "thread-%d" % thread_id))
+            stack.reverse()
+
+            key = ";".join(stack)
+            self.stacks[key] = self.stacks.get(key, 0) + weight
+
+            # a function is only counted once per sample towards its total, however often it
+            # recurses
+            for name in set(stack[1:]):
+                self.function_stats(name)["total"] += weight
+            self.function_stats(stack[-1])["self"] += weight
+        self.samples += 1
+
+
+    def function_stats(self, name):
+        stats = self.functions.get(name)
+        if stats is None:
+            stats = self.functions[name] = {"calls": None, "self": 0., "total": 0.}
+        return stats
+
+
+    def result(self):
+        return ProfileResult("Sampling", self.duration, dict(self.functions), dict(self.stacks))
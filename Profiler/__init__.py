@@ -0,0 +1,4 @@
+# re-exports
+from .Profiler import Profiler, ProfilerModes
+from .SamplingProfiler import SamplingProfiler
+from .ProfileResult import ProfileResult, diff
\ No newline at end of file
@@ -0,0 +1,111 @@
+# Profiles the robot, eg.
+#   python -m Profiler run --replay pi/data/final_countdown.mp4 --out before.json --collapsed before.folded
+#   python -m Profiler run --main --mode CProfile --out field.json
+#   python -m Profiler diff before.json after.json
+#   python -m Profiler show field.json --sort self
+import os
+import sys
+import runpy
+import argparse
+from .Profiler import Profiler, ProfilerModes
+from .ProfileResult import ProfileResult, diff
+from Benchmark.Benchmark import Benchmark, DEFAULT_OPTIONS
+from VisionSystem import ExecutionModes
+from VisionSystem.DetectionModel.ThreshBlob import BlobEngines
+
+
+def relpath(*paths):
+    return os.path.join(os.path.dirname(__file__), "..", *paths)
+
+
+def print_top(result, count, sort):
+    print("%s profile of %.2fs" % (result.mode, result.duration))
+    print("%10s %10s %10s  %s" % ("calls", "self s", "total s", "function"))
+    for name, stats in result.top(count, sort):
+        calls = "-" if stats["calls"] is None else str(stats["calls"])
+        print("%10s %10.4f %10.4f  %s" % (calls, stats["self"], stats["total"], name))
+
+
+def print_diff(rows, count):
+    print("%10s %10s %10s %10s  %s" % ("total s", "delta s", "self delta", "calls delta", "function"))
+    for row in rows[:count]:
+        calls = "-" if row["calls_delta"] is None else "%+d" % row["calls_delta"]
+        print("%10.4f %+10.4f %+10.4f %11s  %s" % (
+            row["total_after"], row["total_delta"], row["self_delta"], calls, row["function"]
+        ))
+
+
+def run(args):
+    profiler = Profiler(ProfilerModes[args.mode], interval=args.interval)
+
+    if args.main:
+        # main.py runs until interrupted, and keeps its profile when it is. Under CProfile only the
+        # main thread is seen, so set PIPELINED = False in main.py to profile the whole loop
+        profiler.run(runpy.run_path, relpath("main.py"), run_name="__main__")
+    else:
+        benchmark = Benchmark(args.replay, args.models_dir, frames=args.frames or None, warmup=0)
+        options = dict(
+            DEFAULT_OPTIONS,
+            downsample_scale=args.scale,
+            fused=args.fused,
+            compiled=args.compiled,
+            blob_engine=args.engine,
+            execution_mode=args.execution_mode
+        )
+        profiler.run(benchmark.replay, options)
+
+    result = profiler.result()
+    print_top(result, args.top, args.sort)
+    if args.out:
+        result.save(args.out)
+    if args.collapsed:
+        result.save_collapsed(args.collapsed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog="python -m Profiler", description="Profile the robot and compare profiles")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    run_parser = commands.add_parser("run", help="profile the main loop or a replayed recording")
+    target = run_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--main", action="store_true", help="run main.py until interrupted")
+    target.add_argument("--replay", metavar="VIDEO", help="replay a recording through the vision system")
+    run_parser.add_argument("--mode", default=ProfilerModes.Sampling.name, choices=[mode.name for mode in ProfilerModes])
+    run_parser.add_argument("--interval", type=float, default=0.001, help="seconds between samples")
+    run_parser.add_argument("--models-dir", default=relpath("detection_models"))
+    run_parser.add_argument("--frames", type=int, default=300, help="frames to replay, 0 for all of them")
+    run_parser.add_argument("--scale", type=float, default=1, help="downsample scale of the replay")
+    run_parser.add_argument("--fused", action="store_true")
+    run_parser.add_argument("--compiled", action="store_true")
+    run_parser.add_argument("--engine", default=BlobEngines.ConnectedComponents.name,
+        choices=[engine.name for engine in BlobEngines])
+    run_parser.add_argument("--execution-mode", default=ExecutionModes.Serial.name,
+        choices=[mode.name for mode in ExecutionModes])
+    run_parser.add_argument("--out", help="where to save the profile")
+    run_parser.add_argument("--collapsed", help="where to save collapsed stacks for a flamegraph")
+    run_parser.add_argument("--top", type=int, default=25)
+    run_parser.add_argument("--sort", default="total", choices=["self", "total"])
+
+    show_parser = commands.add_parser("show", help="print a saved profile (or an old cProfile dump)")
+    show_parser.add_argument("profile")
+    show_parser.add_argument("--top", type=int, default=25)
+    show_parser.add_argument("--sort", default="total", choices=["self", "total"])
+    show_parser.add_argument("--collapsed", help="where to save its collapsed stacks for a flamegraph")
+
+    diff_parser = commands.add_parser("diff", help="compare two profiles function by function")
+    diff_parser.add_argument("before")
+    diff_parser.add_argument("after")
+    diff_parser.add_argument("--top", type=int, default=30)
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run(args)
+    elif args.command == "show":
+        result = ProfileResult.load(args.profile)
+        print_top(result, args.top, args.sort)
+        if args.collapsed:
+            result.save_collapsed(args.collapsed)
+    else:
+        print_diff(diff(ProfileResult.load(args.before), ProfileResult.load(args.after)), args.top)
@@ -0,0 +1,133 @@
+import os
+import cv2
+import csv
+from multiprocessing import Pool, cpu_count
+from VisionSystem import VisionSystem
+from .TelemetryLog import TelemetryLog
+
+
+
+# Labels a raw recording (see VideoRecorder) afterwards from the telemetry logged with it, so
+# the robot needn't label or encode a second video during a match. Chunks of the recording are
+# decoded and labelled in parallel by a pool of processes, and written in order by this one
+class LabelRenderer():
+
+    def __init__(self, telemetry_path, objects=None, workers=None, chunk_size=64):
+        # telemetry_path <str>
+        # the TelemetryLog logged alongside the recording
+        self.header, self.records = TelemetryLog.load(telemetry_path)
+
+        # objects <[str]?>
+        # names of the objects to label, all of those logged if None
+        logged = [obj["name"] for obj in self.header["objects"]]
+        self.objects = logged if objects is None else list(objects)
+        for name in self.objects:
+            if name not in logged:
+                raise Exception("%s wasn't logged, only %s" % (name, ", ".join(logged)))
+
+        # workers <int>, chunk_size <int>
+        # processes to label with (1 labels in this process), and frames each is given at once
+        self.workers = workers or cpu_count()
+        self.chunk_size = chunk_size
+
+        # record_idxs <dict<key=int, val=int>>
+        # index of the record logged for each frame sequence number
+        self.record_idxs = {int(seq): idx for idx, seq in enumerate(self.records["seq"]) if seq >= 0}
+        self.state_names = {val: name for name, val in self.header["states"].items()}
+
+
+    def render(self, raw_path, out_path, index_path=None, fps=20.0, fourcc="XVID"):
+        # index_path <str?>
+        # the recording's index of frame sequence numbers. Defaults to the _index.csv next to a
+        # _raw.avi, and without one the recording's frames are taken to be the logged ones in order
+        if index_path is None and raw_path.endswith("_raw.avi"):
+            index_path = raw_path[:-len("_raw.avi")] + "_index.csv"
+        seqs = read_index(index_path) if index_path and os.path.isfile(index_path) else None
+
+        cap = cv2.VideoCapture(raw_path)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        resolution = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap.release()
+        if seqs is not None:
+            frame_count = min(frame_count, len(seqs))
+
+        writer = cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*fourcc), fps, resolution)
+        if not writer.isOpened():
+            raise Exception("can't write video to %s" % out_path)
+
+        chunks = [
+            (raw_path, start, [self.labels(seqs, frame_idx) for frame_idx in range(start, min(start + self.chunk_size, frame_count))])
+            for start in range(0, frame_count, self.chunk_size)
+        ]
+
+        rendered = 0
+        if self.workers > 1:
+            with Pool(self.workers) as pool:
+                for images in pool.imap(render_chunk, chunks):
+                    rendered += write_all(writer, images)
+        else:
+            for chunk in chunks:
+                rendered += write_all(writer, render_chunk(chunk))
+
+        writer.release()
+        return rendered
+
+
+    def labels(self, seqs, frame_idx):
+        # (state name, [(obj_idx, name, coords, bearings_distances)]) to draw on a frame of the
+        # recording, None if nothing was logged for it
+        if seqs is None:
+            record_idx = frame_idx if frame_idx < len(self.records) else None
+        else:
+            record_idx = self.record_idxs.get(seqs[frame_idx])
+        if record_idx is None:
+            return None
+
+        record = self.records[record_idx]
+        objects = []
+        for obj_idx, obj in enumerate(self.header["objects"]):
+            if obj["name"] not in self.objects:
+                continue
+            obj_record = record[obj["name"]]
+            count = int(obj_record["count"])
+            objects.append((obj_idx, obj["name"], obj_record["coords"][:count].tolist(),
+                obj_record["bearings_distances"][:count].tolist()))
+        return (self.state_names.get(int(record["state"]), ""), objects)
+
+
+
+def render_chunk(chunk):
+    # decodes and labels consecutive frames of a recording, see LabelRenderer.labels()
+    raw_path, start, frame_labels = chunk
+    cap = cv2.VideoCapture(raw_path)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    images = []
+    for labels in frame_labels:
+        ok, img = cap.read()
+        if not ok:
+            break
+        if labels is not None:
+            state, objects = labels
+            for obj_idx, name, coords, bearings_distances in objects:
+                img = VisionSystem.draw_detections(img, obj_idx, name, coords, bearings_distances)
+            cv2.putText(img, text=state, org=(15, 15), fontFace=cv2.FONT_HERSHEY_PLAIN, fontScale=1.5,
+                color=(0, 255, 255))
+        images.append(img)
+
+    cap.release()
+    return images
+
+
+def write_all(writer, images):
+    for img in images:
+        writer.write(img)
+    return len(images)
+
+
+def read_index(index_path):
+    # seqs <[int?]>
+    # the sequence number of each frame of a recording, from its _index.csv
+    with open(index_path) as index_file:
+        return [int(row["seq"]) if row["seq"] else None for row in csv.DictReader(index_file)]
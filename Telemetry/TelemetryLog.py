@@ -0,0 +1,155 @@
+import json
+import struct
+import numpy as np
+from threading import Lock
+from time import perf_counter
+
+
+MAGIC = b"EGB320TL"
+LOG_VERSION = 1
+
+# results kept per frame for objects without a result limit (eg. obstacles)
+DEFAULT_MAX_RESULTS = 8
+
+
+
+# Append-only binary log of what the robot saw and did on each frame, cheap enough to write
+# during a match in place of labelled video. The file is a JSON header followed by fixed-size
+# records of a NumPy structured dtype (see record_dtype()), so that load() reads a whole match
+# straight into an array with no decoding:
+#   header, records = TelemetryLog.load(path)
+#   records["ball"]["bearings_distances"][records["ball"]["count"] > 0, 0]
+# Records are buffered in memory and written every buffer_size records or flush_interval
+# seconds, whichever comes first. A log cut short (eg. by a power cut) loads up to its last
+# whole record
+class TelemetryLog():
+
+    def __init__(self, path, objects_to_track, states=None, buffer_size=256, flush_interval=1.0):
+        # path <str>
+        self.path = path
+
+        # objects_to_track <dict<key=str, val=VisualObject>>
+        # objects to log each frame's results of, at most their result_limit (or
+        # DEFAULT_MAX_RESULTS) of them
+        self.object_limits = [
+            (name, obj.result_limit or DEFAULT_MAX_RESULTS) for name, obj in objects_to_track.items()
+        ]
+
+        # states <Enum?>
+        # the enum of navigation states (eg. NavStates), whose values are logged
+        self.states = states
+
+        self.dtype = record_dtype(self.object_limits)
+        self.buffer = np.zeros(buffer_size, dtype=self.dtype)
+        self.buffered = 0
+        self.flush_interval = flush_interval
+        self.last_flush = perf_counter()
+
+        # logged <int>
+        # records logged so far, including those still buffered
+        self.logged = 0
+
+        self.lock = Lock()
+        self.file = open(path, 'wb')
+        header = json.dumps({
+            "version": LOG_VERSION,
+            "objects": [{"name": name, "max_results": limit} for name, limit in self.object_limits],
+            "states": {state.name: state.value for state in states} if states is not None else {}
+        }).encode()
+        self.file.write(MAGIC + struct.pack("<I", len(header)) + header)
+        self.file.flush()
+
+
+    def log(self, frame, snapshot, state=None, drive_command=None):
+        # frame <Frame>: the frame the snapshot was detected on
+        # snapshot: the vision system's results, as returned by VisionSystem.snapshot()
+        # state <Enum?>: the navigation state acted in
+        # drive_command <tuple<float, float, float>?>: (velx, vely, velRot) the drive system was
+        #     last given, see DriveSystem.last_command
+        with self.lock:
+            record = self.buffer[self.buffered]
+            record["seq"] = -1 if frame.seq is None else frame.seq
+            record["timestamp"] = frame.timestamp
+            record["state"] = 0 if state is None else state.value
+            record["drive_command"] = np.nan if drive_command is None else drive_command
+
+            for name, limit in self.object_limits:
+                detection_results, bearings_distances, _, updated_at = snapshot[name]
+                count = min(limit, len(detection_results))
+                obj_record = record[name]
+                obj_record["count"] = count
+                obj_record["updated_at"] = np.nan if updated_at is None else updated_at
+                obj_record["coords"] = 0
+                obj_record["bearings_distances"] = np.nan
+                for result_idx in range(count):
+                    obj_record["coords"][result_idx] = detection_results[result_idx].coords
+                    obj_record["bearings_distances"][result_idx] = bearings_distances[result_idx]
+
+            self.buffered += 1
+            self.logged += 1
+            if self.buffered == len(self.buffer) or perf_counter() - self.last_flush >= self.flush_interval:
+                self.flush_buffer()
+
+
+    def flush(self):
+        with self.lock:
+            self.flush_buffer()
+
+
+    def flush_buffer(self):
+        # lock must be held
+        self.file.write(self.buffer[:self.buffered].tobytes())
+        self.file.flush()
+        self.buffered = 0
+        self.last_flush = perf_counter()
+
+
+    def close(self):
+        with self.lock:
+            self.flush_buffer()
+            self.file.close()
+
+
+    @staticmethod
+    def load(path):
+        # (header <dict>, records <np.array>) of a log, see record_dtype() for the fields
+        with open(path, 'rb') as log_file:
+            if log_file.read(len(MAGIC)) != MAGIC:
+                raise Exception("%s is not a telemetry log" % path)
+            header_size, = struct.unpack("<I", log_file.read(4))
+            header = json.loads(log_file.read(header_size).decode())
+            if header["version"] != LOG_VERSION:
+                raise Exception("telemetry log %s is version %s, expected %d" % (path, header["version"], LOG_VERSION))
+
+            dtype = record_dtype([(obj["name"], obj["max_results"]) for obj in header["objects"]])
+            data = log_file.read()
+
+        whole_records = len(data) // dtype.itemsize
+        return header, np.frombuffer(data[:whole_records * dtype.itemsize], dtype=dtype)
+
+
+
+def record_dtype(object_limits):
+    # seq: frame sequence number, -1 if the frame wasn't numbered
+    # timestamp: perf_counter() time the frame was captured
+    # state: value of the navigation state, 0 for none
+    # drive_command: (velx, vely, velRot) last given to the drive system, NaN before the first
+    # and for each object:
+    #   count: number of results kept (up to its max_results)
+    #   updated_at: timestamp of the frame its results were detected on (see DetectionScheduler)
+    #   coords: ((x1, y1), (x2, y2)) of each result in pixels, 0 past count
+    #   bearings_distances: (bearing, distance) of each result, NaN past count
+    return np.dtype([
+        ("seq", "<i8"),
+        ("timestamp", "<f8"),
+        ("state", "<i2"),
+        ("drive_command", "<f4", (3,)),
+    ] + [
+        (name, [
+            ("count", "<u1"),
+            ("updated_at", "<f8"),
+            ("coords", "<i4", (limit, 2, 2)),
+            ("bearings_distances", "<f4", (limit, 2))
+        ]) for name, limit in object_limits
+    ])
+
@@ -0,0 +1,3 @@
+# re-exports
+from .TelemetryLog import TelemetryLog
+from .LabelRenderer import LabelRenderer
\ No newline at end of file
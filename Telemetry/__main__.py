@@ -0,0 +1,20 @@
+# Labels a raw recording afterwards from the telemetry logged with it, eg.
+#   python -m Telemetry debug_data/profile_vid_raw.avi debug_data/telemetry0.tlog labelled.avi --objects ball obstacle
+import argparse
+from .LabelRenderer import LabelRenderer
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog="python -m Telemetry", description="Label a raw recording from its telemetry")
+    parser.add_argument("raw_path", help="recording made by VideoRecorder")
+    parser.add_argument("telemetry_path", help="TelemetryLog logged alongside it")
+    parser.add_argument("out_path", help="where to write the labelled video")
+    parser.add_argument("--objects", nargs='+', help="objects to label, all of them by default")
+    parser.add_argument("--index", help="the recording's _index.csv, found next to it by default")
+    parser.add_argument("--workers", type=int, help="processes to label with, one per core by default")
+    parser.add_argument("--fps", type=float, default=20.0)
+    args = parser.parse_args()
+
+    renderer = LabelRenderer(args.telemetry_path, objects=args.objects, workers=args.workers)
+    rendered = renderer.render(args.raw_path, args.out_path, index_path=args.index, fps=args.fps)
+    print("labelled %d frames" % rendered)
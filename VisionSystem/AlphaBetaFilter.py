@@ -0,0 +1,97 @@
+from time import perf_counter
+
+
+
+# Alpha-beta filter over an object's (bearing, distance) from the robot, so that its position can
+# be estimated at any time from past detections: between frames, on frames that skipped detection,
+# or for a short while after the object was last seen
+class AlphaBetaFilter():
+
+    def __init__(self, alpha=0.6, beta=0.2, max_age=0.5, gate=(0.35, 0.5)):
+        # alpha <float>, beta <float>
+        # how much of each measurement's residual is taken into the position and velocity
+        # respectively. Higher values follow the detections more closely, lower ones smooth more
+        self.alpha = alpha
+        self.beta = beta
+
+        # max_age <float>
+        # seconds after the last detection that the object is still estimated to be there
+        self.max_age = max_age
+
+        # gate <tuple<float, float>>
+        # largest bearing residual (radians) and relative distance residual that are taken to be
+        # the same object moving. A bigger jump restarts the filter at the new detection
+        self.gate = gate
+
+        # position <tuple<float, float>?>, velocity <tuple<float, float>>
+        # (bearing, distance) in radians and metres at last_time, and their rates per second
+        self.position = None
+        self.velocity = (0., 0.)
+        self.last_time = None
+
+
+    def clear(self):
+        # forgets the object, as if it had never been detected
+        self.position = None
+        self.velocity = (0., 0.)
+        self.last_time = None
+
+
+    def update(self, bearing_distance, timestamp=None):
+        timestamp = perf_counter() if timestamp is None else timestamp
+        bearing, distance = bearing_distance
+
+        if self.position is None or timestamp - self.last_time > self.max_age:
+            return self.reset(bearing_distance, timestamp)
+
+        dt = timestamp - self.last_time
+        if dt <= 0:
+            # same (or an out of order) frame, so there is no motion to learn from
+            self.position = (bearing, distance)
+            return self.position
+
+        predicted = self.predict(dt)
+        residual = (bearing - predicted[0], distance - predicted[1])
+        if abs(residual[0]) > self.gate[0] or abs(residual[1]) > self.gate[1] * max(predicted[1], distance):
+            return self.reset(bearing_distance, timestamp)
+
+        self.position = (
+            predicted[0] + self.alpha * residual[0],
+            max(0., predicted[1] + self.alpha * residual[1])
+        )
+        self.velocity = (
+            self.velocity[0] + self.beta * residual[0] / dt,
+            self.velocity[1] + self.beta * residual[1] / dt
+        )
+        self.last_time = timestamp
+        return self.position
+
+
+    def reset(self, bearing_distance=None, timestamp=None):
+        self.position = tuple(bearing_distance) if bearing_distance is not None else None
+        self.velocity = (0., 0.)
+        self.last_time = timestamp
+        return self.position
+
+
+    def predict(self, dt):
+        return (
+            self.position[0] + self.velocity[0] * dt,
+            max(0., self.position[1] + self.velocity[1] * dt)
+        )
+
+
+    def estimate(self, timestamp=None):
+        # (bearing, distance) at timestamp (perf_counter() seconds, defaulting to now), or None
+        # if the object hasn't been seen within max_age of it
+        timestamp = perf_counter() if timestamp is None else timestamp
+        if self.position is None or timestamp - self.last_time > self.max_age:
+            return None
+        return self.predict(max(0., timestamp - self.last_time))
+
+
+    def age(self, timestamp=None):
+        # seconds since the last detection, None if there hasn't been one
+        if self.last_time is None:
+            return None
+        return (perf_counter() if timestamp is None else timestamp) - self.last_time
@@ -0,0 +1,107 @@
+import os
+import numpy as np
+from threading import Lock
+from .ModelFormat import content_hash
+
+
+# where artefacts are cached unless EGB320_ARTEFACT_CACHE says otherwise. Set it to 0 to turn
+# the cache off
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "egb320", "artefacts")
+
+# the cache shared by every model, see artefact_cache()
+shared_cache = None
+shared_cache_lock = Lock()
+
+
+
+# On-disk cache of arrays compiled from models (eg. ColorLUT tables), keyed by the content hash
+# of whatever they were compiled from, so that start-up loads them rather than compiling them
+# again. Arrays are memory-mapped rather than read, so only the pages used are loaded and every
+# process using one shares the same memory. The least recently used are removed once the cache
+# holds more than max_bytes
+class ArtefactCache():
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        # directory <str>
+        # made if it doesn't exist
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+
+    @staticmethod
+    def key(*parts):
+        # cache key of everything an artefact depends on, which must be JSON-serializable
+        return content_hash(list(parts))
+
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".npy")
+
+
+    def get(self, key):
+        # the cached array, read-only, or None if there isn't one
+        path = self.path(key)
+        try:
+            array = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            # missing, or left unreadable by something other than put()
+            return None
+        try:
+            os.utime(path) # marks it recently used
+        except OSError:
+            # only a hint for prune(), so a cache this process can't write (eg. another user's, or
+            # on a read-only mount) still serves its hits
+            pass
+        # a plain ndarray over the same mapping, since results computed from an np.memmap are
+        # np.memmaps too
+        return array.view(np.ndarray)
+
+
+    def put(self, key, array):
+        # caches array, returning the cached copy (or array itself if it couldn't be cached, eg.
+        # on a full or read-only disk, or if it alone is bigger than max_bytes)
+        path = self.path(key)
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as artefact_file:
+                np.save(artefact_file, array)
+            os.replace(tmp_path, path)
+            self.prune()
+        except OSError:
+            return array
+
+        cached = self.get(key)
+        return array if cached is None else cached
+
+
+    def prune(self):
+        artefacts = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npy"):
+                stat = os.stat(os.path.join(self.directory, name))
+                artefacts.append((stat.st_mtime, stat.st_size, name))
+
+        total_bytes = sum(size for _, size, _ in artefacts)
+        for _, size, name in sorted(artefacts):
+            if total_bytes <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total_bytes -= size
+
+
+
+def artefact_cache():
+    # the ArtefactCache shared by every model, None if it is turned off (or can't be made)
+    global shared_cache
+    directory = os.environ.get("EGB320_ARTEFACT_CACHE", DEFAULT_CACHE_DIR)
+    if directory in ("", "0"):
+        return None
+
+    with shared_cache_lock:
+        if shared_cache is None or shared_cache.directory != directory:
+            try:
+                shared_cache = ArtefactCache(directory)
+            except OSError:
+                return None
+        return shared_cache
@@ -3,7 +3,11 @@ import cv2
 
 class ColorSpace():
 
-    def __init__(self, name, colorCvt_flag, channels):
+    # class-level default so that colorspaces pickled before it existed still load
+    colorCvtInverse_flag = None
+
+
+    def __init__(self, name, colorCvt_flag, channels, colorCvtInverse_flag=None):
         # name <str>
         # name of this colorspace for display purposes
         self.name = name
@@ -13,17 +17,33 @@ class ColorSpace():
         # if none, will stay as bgr image
         self.colorCvt_flag = colorCvt_flag
 
+        # colorCvtInverse_flag <int?>
+        # flag to be used by the function cv.cvtColor() to get back to a BGR image, for frames
+        # captured in this colorspace
+        self.colorCvtInverse_flag = colorCvtInverse_flag
+
         # colorspace_labels <list<str>>
         # labels to be used by the pixel intensity inspector
         self.channel_labels = [label for (label, _) in channels]
         self.channel_limits = [limits for (_, limits) in channels]
 
 
-    def bgr2this(self, bgr_img):
+    def bgr2this(self, bgr_img, dst=None):
+        # dst: optional preallocated destination image, to avoid allocating a new one
         if self.colorCvt_flag is None:
             return bgr_img
         else:
-            return cv2.cvtColor(bgr_img, self.colorCvt_flag)
+            return cv2.cvtColor(bgr_img, self.colorCvt_flag, dst=dst)
+
+
+    def this2bgr(self, img, dst=None):
+        # dst: optional preallocated destination image, to avoid allocating a new one
+        if self.colorCvt_flag is None:
+            return img
+        elif self.colorCvtInverse_flag is None:
+            raise Exception("there is no conversion from %s back to BGR" % self.name)
+        else:
+            return cv2.cvtColor(img, self.colorCvtInverse_flag, dst=dst)
 
 
     def valRange(self, channel_idx):
@@ -40,6 +60,11 @@ class ColorSpaceScale(Enum):
 
 class ColorSpaces(Enum):
 
+    # pickle members by name. The default pickles them by value, and an unpickled ColorSpace
+    # is a new object that no longer matches any member (eg. frames sent to worker processes)
+    def __reduce_ex__(self, protocol):
+        return getattr, (self.__class__, self.name)
+
     BGR = ColorSpace("BGR", None, [
         ('Blue', (0, 255)),
         ('Green', (0, 255)),
@@ -50,10 +75,24 @@ class ColorSpaces(Enum):
         ('Hue', (-180, 180)),
         ('Saturation', (0, 255)),
         ('Value', (0, 255))
-    ])
+    ], cv2.COLOR_HSV2BGR)
     
     CIELab = ColorSpace("CIELab", cv2.COLOR_BGR2Lab, [
         ('L', (0, 255)),
         ('a', (0, 255)),
         ('b', (0, 255))
-    ])
\ No newline at end of file
+    ], cv2.COLOR_Lab2BGR)
+
+    YUV = ColorSpace("YUV", cv2.COLOR_BGR2YUV, [
+        ('Y', (0, 255)),
+        ('U', (0, 255)),
+        ('V', (0, 255))
+    ], cv2.COLOR_YUV2BGR)
+
+    # the Pi camera's native output (full-range BT.601 YCbCr), with the chroma channels in
+    # OpenCV's order. Models tuned in this colorspace threshold the capture buffer directly
+    YCrCb = ColorSpace("YCrCb", cv2.COLOR_BGR2YCrCb, [
+        ('Y', (0, 255)),
+        ('Cr', (0, 255)),
+        ('Cb', (0, 255))
+    ], cv2.COLOR_YCrCb2BGR)
\ No newline at end of file
@@ -1,20 +1,38 @@
 import pickle
 from abc import ABC, abstractmethod
+from .ModelFormat import load_model, save_model, is_model_file
 
 
 
 class DetectionModel(ABC):
 
-    # apply <np.array<uint8> -> DetectionResult>
+    # apply <Frame -> [DetectionResult]>
+    # mask: optional pre-thresholded mask to start from, for models that threshold
+    # limit: optional maximum number of results wanted (largest first), so that models
+    #   can skip work on results that would be discarded
     @abstractmethod
-    def apply(self, img):
+    def apply(self, frame, mask=None, limit=None):
         pass
 
 
+    # prepare <ColorSpaces -> None>
+    # builds anything the model would otherwise build on its first apply() to frames captured in
+    # the given colorspace, so that the first frames aren't slower than the rest
+    def prepare(self, source):
+        pass
+
+
+    # models are saved in the versioned JSON format (see ModelFormat) when the path ends in
+    # .json, and pickled otherwise
     @staticmethod
     def load(path):
+        if is_model_file(path):
+            return load_model(path)
         return pickle.load(open(path, 'rb'))
 
 
     def save(self, path):
-        pickle.dump(self, open(path, 'wb'), -1)
\ No newline at end of file
+        if is_model_file(path):
+            save_model(self, path)
+        else:
+            pickle.dump(self, open(path, 'wb'), -1)
\ No newline at end of file
@@ -3,19 +3,65 @@ class DetectionResult():
     # rectangular bounds of detected object.
 
     # coords <tuple<tuple<int, int>, tuple<int, int>>>
-    # pixel coords of lower left and upper-right corners of bounding box rect, respectively
+    # pixel coords of lower left and upper-right corners of bounding box rect, respectively.
+    # The far corner is exclusive (one past the last pixel of the blob) for every model, so that
+    # x2 - x1 is the box's width in pixels
     coords = (None, None)
 
     # bitmask <np.array<uint8>?>
     # bitmask of the solution
     bitmask = None
+
+    # centroid <tuple<float, float>?>
+    # pixel coords of the centre of mass of the detected blob, if the model measured it
+    centroid = None
+
+    # pixel_area <int?>
+    # number of pixels in the detected blob, if the model measured it
+    pixel_area = None
     
 
-    def __init__(self, coords, bitmask=None):
+    def __init__(self, coords, bitmask=None, centroid=None, pixel_area=None):
         self.coords = coords
         self.bitmask = bitmask
+        self.centroid = centroid
+        self.pixel_area = pixel_area
 
     
     def area(self):
         ((x1, y1), (x2, y2)) = self.coords
-        return (x2 - x1) * (y2 - y1)
\ No newline at end of file
+        return (x2 - x1) * (y2 - y1)
+
+
+    def center(self):
+        # centre of mass if the model measured it, otherwise the centre of the bounding box
+        if self.centroid is not None:
+            return self.centroid
+        ((x1, y1), (x2, y2)) = self.coords
+        return ((x1 + x2) / 2, (y1 + y2) / 2)
+
+
+    def translate(self, dx, dy):
+        # moves the result by (dx, dy) pixels, eg. from a crop's coords back into the frame's.
+        # the bitmask is left as it is
+        ((x1, y1), (x2, y2)) = self.coords
+        self.coords = ((x1 + dx, y1 + dy), (x2 + dx, y2 + dy))
+        if self.centroid is not None:
+            self.centroid = (self.centroid[0] + dx, self.centroid[1] + dy)
+        return self
+
+
+    def rescale(self, sx, sy):
+        # maps the result from a frame scaled down by (sx, sy) back into the full frame's pixels.
+        # the bitmask is left at the scaled size
+        ((x1, y1), (x2, y2)) = self.coords
+        self.coords = (
+            (int(round(x1 * sx)), int(round(y1 * sy))),
+            (int(round(x2 * sx)), int(round(y2 * sy)))
+        )
+        if self.centroid is not None:
+            # pixel centres sit half a pixel in from their corners
+            self.centroid = ((self.centroid[0] + 0.5) * sx - 0.5, (self.centroid[1] + 0.5) * sy - 0.5)
+        if self.pixel_area is not None:
+            self.pixel_area = int(round(self.pixel_area * sx * sy))
+        return self
\ No newline at end of file
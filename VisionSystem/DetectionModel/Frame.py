@@ -1,13 +1,118 @@
 from .ColorSpace import ColorSpace, ColorSpaces
+from threading import Lock
 import cv2
 import numpy as np
+import weakref
+from time import perf_counter
+import Instrumentation
+
+
+
+# Recycles the destination buffers of colorspace conversions between frames of the same size,
+# so that a steady stream of frames makes no large allocations
+class FramePool():
+
+    def __init__(self, max_free=4):
+        # max_free <int>
+        # the most spare buffers kept for each colorspace and image size
+        self.max_free = max_free
+        self.free = {}
+        self.lock = Lock()
+
+
+    def acquire(self, colorspace, shape):
+        with self.lock:
+            buffers = self.free.get((colorspace, shape))
+            if buffers:
+                return buffers.pop()
+        return np.empty(shape, dtype=np.uint8)
+
+
+    def recycle(self, colorspace, img):
+        with self.lock:
+            buffers = self.free.setdefault((colorspace, img.shape), [])
+            if len(buffers) < self.max_free:
+                buffers.append(img)
+
+
+
+# guards the making of each frame's scaled levels, which models on different threads may ask for
+# at the same time
+SCALE_LOCK = Lock()
 
 
 
 class Frame():
+
+    # seq <int?>
+    # sequence number of this frame in the stream it came from, if it came from one
+    seq = None
+
+    # timestamp <float?>
+    # perf_counter() time the frame was captured, or made if it wasn't captured by a live stream
+    timestamp = None
+
+    # source <ColorSpaces>
+    # the colorspace the frame was captured in, which every other one is converted from
+    source = ColorSpaces.BGR
+
+    release_finalizer = None
+    pool = None
+    pooled = ()
+    owns_bgr = False
+    scaled_frames = None
+
     
-    def __init__(self, bgr_img):
-        self.link_bgr(bgr_img)
+    def __init__(self, bgr_img, on_release=None, pool=None, colorspace=ColorSpaces.BGR):
+        # pool <FramePool?>
+        # where colorspace conversions get their destination buffers from, and are returned to
+        # when the frame is released
+        self.pool = pool
+        self.pooled = set()
+        self.timestamp = perf_counter()
+
+        # colorspace: the colorspace of the given image, when not BGR (eg. a YCrCb camera capture).
+        # BGR is then only built if something asks for it
+        if colorspace is ColorSpaces.BGR:
+            self.link_bgr(bgr_img)
+        else:
+            self.source = colorspace
+            self.colorspace2img = {
+                colorspace: bgr_img
+            }
+
+        # on_release <() -> None>?
+        # hands the frame's buffers back to their owner (eg. the VideoStream's ring buffer).
+        # called once, by release() or when the frame is garbage collected, whichever is first
+        if on_release is not None:
+            self.release_finalizer = weakref.finalize(self, on_release)
+
+
+    def __getstate__(self):
+        # a frame sent to another process is a copy, so has nothing to release
+        state = {key: val for key, val in self.__dict__.items() if key not in ('release_finalizer', 'pool')}
+        state['pooled'] = set()
+        return state
+
+
+    def release(self):
+        # done with this frame: its buffers may be reused for later frames, so neither the frame
+        # nor any image taken from it may be used afterwards
+        for scaled_frame in (self.scaled_frames or {}).values():
+            scaled_frame.release()
+        self.scaled_frames = None
+        self.recycle_planes()
+        if self.release_finalizer is not None:
+            self.release_finalizer()
+
+
+    def recycle_planes(self):
+        # hand the pooled conversions back to the pool
+        for colorspace in self.pooled:
+            img = self.colorspace2img.pop(colorspace, None)
+            if img is not None:
+                self.pool.recycle(colorspace, img)
+        self.pooled = set()
 
 
     def get(self, colorspace=ColorSpaces.BGR):
@@ -16,23 +121,116 @@ class Frame():
         
         if colorspace in self.colorspace2img:
             return self.colorspace2img[colorspace]
+
+        if colorspace is ColorSpaces.BGR:
+            src_img = self.colorspace2img[self.source]
+            convert = self.source.value.this2bgr
         else:
-            self.colorspace2img[colorspace] = colorspace.value.bgr2this(self.get())
-            return self.colorspace2img[colorspace]
+            src_img = self.get()
+            convert = colorspace.value.bgr2this
+
+        start = Instrumentation.start()
+        if self.pool is not None:
+            img = convert(src_img, dst=self.pool.acquire(colorspace, src_img.shape))
+            self.pooled.add(colorspace)
+        else:
+            img = convert(src_img)
+        Instrumentation.stop("convert", start)
+
+        self.colorspace2img[colorspace] = img
+        return img
+
+
+    def crop(self, x1, y1, x2, y2):
+        # a frame of the (x1, y1) to (x2, y2) rectangle of this one, the far corner exclusive.
+        # it views the planes already converted here rather than copying them, and anything it
+        # converts itself is of the crop only. It must not outlive this frame
+        cropped = Frame(self.colorspace2img[self.source][y1:y2, x1:x2], pool=self.pool, colorspace=self.source)
+        for colorspace, img in self.colorspace2img.items():
+            cropped.link(colorspace, img[y1:y2, x1:x2])
+        cropped.seq = self.seq
+        cropped.timestamp = self.timestamp
+        return cropped
+
+
+    def scaled(self, scale):
+        # this frame shrunk by a factor of scale (eg. 2 for half the width and height), made once
+        # and shared by every model that asks for the same scale. It is resized from the source
+        # plane, and its other colorspaces are converted (and cached) at the smaller size, so that
+        # eg. a hue is never averaged across pixels. It must not outlive this frame
+        if scale == 1:
+            return self
+
+        with SCALE_LOCK:
+            if self.scaled_frames is None:
+                self.scaled_frames = {}
+            if scale in self.scaled_frames:
+                return self.scaled_frames[scale]
+
+            src_img = self.colorspace2img[self.source]
+            height, width = src_img.shape[:2]
+            size = (max(1, int(round(width / scale))), max(1, int(round(height / scale))))
+            shape = (size[1], size[0]) + src_img.shape[2:]
+
+            dst = self.pool.acquire(self.source, shape) if self.pool is not None else None
+            scaled_frame = Frame(
+                cv2.resize(src_img, size, dst=dst, interpolation=cv2.INTER_AREA),
+                pool=self.pool,
+                colorspace=self.source
+            )
+            if self.pool is not None:
+                scaled_frame.pooled.add(self.source)
+            scaled_frame.seq = self.seq
+            scaled_frame.timestamp = self.timestamp
+
+            self.scaled_frames[scale] = scaled_frame
+            return scaled_frame
+
+
+    def shape(self):
+        # (height, width) of the frame in pixels
+        return self.colorspace2img[self.source].shape[:2]
+
+
+    def link(self, colorspace, img):
+        # use an already converted image (eg. from a FrameStore) for this colorspace
+        if type(colorspace) is ColorSpace:
+            colorspace = ColorSpaces[colorspace.name]
+        self.colorspace2img[colorspace] = img
 
 
     def link_bgr(self, bgr_img):
+        # bgr_img may be one of this frame's own pooled planes (eg. frame.link_bgr(draw(frame.get()))),
+        # in which case it leaves the pool for good rather than being recycled while still in use
+        for colorspace in list(self.pooled):
+            if self.colorspace2img.get(colorspace) is bgr_img:
+                self.pooled.discard(colorspace)
+        self.recycle_planes()
+        self.source = ColorSpaces.BGR
         self.colorspace2img = {
             ColorSpaces.BGR: bgr_img
         }
+        self.owns_bgr = False
 
 
     def copy_bgr(self, bgr_img):
         if bgr_img is None:
             raise "error"
+
+        # reuse the last copy's buffer when it is still this frame's own and the same size
+        own_img = self.colorspace2img.get(ColorSpaces.BGR) if self.owns_bgr else None
+        if own_img is not None and own_img.shape == bgr_img.shape:
+            np.copyto(own_img, bgr_img)
+        else:
+            own_img = np.copy(bgr_img)
+        # only once copied, as bgr_img may be one of the planes being recycled
+        self.recycle_planes()
+
+        self.source = ColorSpaces.BGR
         self.colorspace2img = {
-            ColorSpaces.BGR: np.copy(bgr_img)
+            ColorSpaces.BGR: own_img
         }
+        self.owns_bgr = True
 
     @staticmethod
     def copy_of(frame):
@@ -0,0 +1,125 @@
+import os
+import json
+import pickle
+import hashlib
+
+
+# Versioned JSON format for detection models, eg. detection_models/ball_model.threshblob.json:
+#   {"version": 1, "type": "ThreshBlob", "hash": "<sha256>", "model": {...parameters...}}
+# Only parameters are stored (see ThreshBlob.to_dict()), so saved models don't depend on how the
+# classes are laid out, and anything compiled from them is cached separately (see ArtefactCache)
+# under their content hash. Files are replaced atomically, so the tuner can save a model while
+# the robot loads it
+MODEL_FORMAT_VERSION = 1
+
+
+
+def content_hash(params):
+    # sha256 of parameters as canonical JSON, so that equal parameters always hash the same
+    return hashlib.sha256(json.dumps(params, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def model_types():
+    # the models that can be saved, by the name stored in the file
+    from .ThreshBlob import ThreshBlob
+    return {"ThreshBlob": ThreshBlob}
+
+
+def save_model(model, path):
+    params = model.to_dict()
+    document = {
+        "version": MODEL_FORMAT_VERSION,
+        "type": type(model).__name__,
+        "hash": content_hash(params),
+        "model": params
+    }
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as model_file:
+        json.dump(document, model_file, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def load_model(path, check_hash=True):
+    # check_hash <bool>
+    # whether to reject a model whose parameters don't match its hash, ie. that was edited by
+    # hand. Load a deliberate edit with False and save() it again to rehash it
+    with open(path) as model_file:
+        document = json.load(model_file)
+
+    if document.get("version") != MODEL_FORMAT_VERSION:
+        raise Exception("model %s is format version %s, expected %d" % (path, document.get("version"), MODEL_FORMAT_VERSION))
+    if check_hash and content_hash(document["model"]) != document["hash"]:
+        raise Exception("model %s doesn't match its hash, so was changed by something other than save(). If the change "
+            "was meant, load it with load_model(path, check_hash=False) and save() it again" % path)
+
+    model_type = model_types().get(document["type"])
+    if model_type is None:
+        raise Exception("model %s is of unknown type %s" % (path, document["type"]))
+    return model_type.from_dict(document["model"])
+
+
+def is_model_file(path):
+    return path.endswith(".json")
+
+
+def convert_pickle(pickle_path, model_path=None):
+    # saves a pickled ThreshBlob in the JSON format (by default next to it, as .json rather than
+    # .pkl). The pickle is read into PickledStubs rather than the real classes, so models pickled
+    # by any past layout of them convert
+    from .ThreshBlob import BlobEngines
+    with open(pickle_path, 'rb') as pickle_file:
+        stub = StubUnpickler(pickle_file).load()
+
+    thresholder = stub.thresholder
+    colorspace = thresholder.colorspace
+    params = {
+        "thresholder": {
+            "colorspace": colorspace.name if hasattr(colorspace, "name") else colorspace.args[-1],
+            "lower": [int(val) for val in thresholder.lower],
+            "upper": [int(val) for val in thresholder.upper],
+            "erosion1": int(thresholder.erosion1),
+            "dilation1": int(thresholder.dilation1),
+            "erosion2": int(thresholder.erosion2),
+            "dilation2": int(thresholder.dilation2),
+            "compiled": bool(getattr(thresholder, "compiled", False)),
+            "lut_bits": [int(bits) for bits in getattr(thresholder, "lut_bits", (6, 6, 6))]
+        },
+        "blob_detector_params": dict(stub.blob_detector_params),
+        # enums other than ColorSpaces are pickled by value
+        "blob_engine": BlobEngines(stub.blob_engine.args[0]).name if hasattr(stub, "blob_engine") else "SimpleBlobDetector"
+    }
+
+    model = model_types()["ThreshBlob"].from_dict(params)
+    if model_path is None:
+        model_path = os.path.splitext(pickle_path)[0] + ".json"
+    save_model(model, model_path)
+    return model_path
+
+
+
+# Stands in for any of this repo's classes when reading an old pickle, keeping whatever state or
+# constructor arguments it was pickled with
+class PickledStub():
+
+    def __init__(self, *args):
+        self.args = args
+
+
+    def __setstate__(self, state):
+        if type(state) is tuple:
+            # (__dict__, __slots__ state)
+            state = state[0] or {}
+        self.__dict__.update(state)
+
+
+
+class StubUnpickler(pickle.Unpickler):
+
+    def find_class(self, module, name):
+        if module.split('.')[0] in ("VisionSystem", "DetectionModel"):
+            return type(name, (PickledStub,), {})
+        if module == "builtins" and name == "getattr":
+            # enum members pickled by name, see ColorSpaces.__reduce_ex__
+            return lambda cls, member: cls(member)
+        return super().find_class(module, name)
@@ -0,0 +1,102 @@
+from ..ColorSpace import ColorSpaces
+from ..ArtefactCache import ArtefactCache
+import numpy as np
+
+
+# bump whenever compile() changes what it builds, so that tables cached by older versions aren't used
+LUT_VERSION = 1
+
+
+
+class ColorLUT():
+
+    def __init__(self, bits=(6, 6, 6), source=ColorSpaces.BGR):
+        # bits <tuple<int, int, int>>
+        # number of bits kept from each channel when indexing the table.
+        # 8 bits per channel is exact but makes a 16MB table; 6 bits (the default) makes a
+        # 256KB table that fits in the Pi's L2 cache far better
+        self.bits = tuple(bits)
+        if len(self.bits) != 3 or any(b < 1 or b > 8 for b in self.bits):
+            raise Exception("bits must be 3 integers between 1 and 8 (one for each channel)")
+
+        # source <ColorSpaces>
+        # the colorspace of the images the table is indexed by, normally the frames' capture colorspace
+        self.source = source
+
+        self.shifts = np.array([8 - b for b in self.bits], dtype=np.uint8)
+
+        # table <np.array<uint8>>
+        # one entry per quantized source value, compiled by compile()
+        self.table = None
+
+
+    def palette(self):
+        # every quantized source value as a (N, 1, 3) image, with each value taken from the
+        # centre of its quantization bin. Shaped like an image so that it can be pushed through
+        # exactly the same cvtColor / inRange path as a real frame
+        b_bits, g_bits, r_bits = self.bits
+        channels = np.meshgrid(
+            np.arange(1 << b_bits, dtype=np.uint16),
+            np.arange(1 << g_bits, dtype=np.uint16),
+            np.arange(1 << r_bits, dtype=np.uint16),
+            indexing='ij'
+        )
+        palette = np.stack([
+            (channel << shift) + ((1 << shift) >> 1)
+            for channel, shift in zip(channels, self.shifts)
+        ], axis=-1)
+        return palette.reshape(-1, 1, 3).astype(np.uint8)
+
+
+    def compile(self, thresholders, values=None, cache=None):
+        # thresholders <[Thresholder]>
+        # the table entry for each source value is the bitwise-or of values[i] for every
+        # thresholders[i] that accepts that value. By default a single thresholder compiles
+        # to a 0 / 255 mask, like cv2.inRange
+        # cache <ArtefactCache?>
+        # where to look for the table before compiling it, and to keep it afterwards. Cached
+        # tables are memory-mapped read-only
+        values = values or [255] * len(thresholders)
+
+        if cache is not None:
+            # only the parameters that change the table, so eg. tuning morphology doesn't miss
+            key = ArtefactCache.key("ColorLUT", LUT_VERSION, self.bits, self.source.name, [int(val) for val in values], [
+                {name: params[name] for name in ("colorspace", "lower", "upper")}
+                for params in (thresholder.to_dict() for thresholder in thresholders)
+            ])
+            self.table = cache.get(key)
+            if self.table is None:
+                self.table = cache.put(key, self.build(thresholders, values))
+        else:
+            self.table = self.build(thresholders, values)
+        return self
+
+
+    def build(self, thresholders, values):
+        palette = self.palette()
+        bgr_palette = self.source.value.this2bgr(palette)
+        table = np.zeros(palette.shape[0], dtype=np.uint8)
+
+        for thresholder, value in zip(thresholders, values):
+            if thresholder.colorspace.name == self.source.name:
+                colorspace_palette = palette
+            else:
+                colorspace_palette = thresholder.colorspace.bgr2this(bgr_palette)
+            accepted = thresholder.threshold(colorspace_palette)
+            table[accepted.reshape(-1) > 0] |= value
+
+        return table
+
+
+    def index(self, img):
+        # flat table index of every pixel of an image in the source colorspace
+        quantized = np.right_shift(img, self.shifts)
+        _, g_bits, r_bits = self.bits
+        idx = quantized[..., 0].astype(np.int32) << (g_bits + r_bits)
+        idx |= quantized[..., 1].astype(np.int32) << r_bits
+        idx |= quantized[..., 2]
+        return idx
+
+
+    def apply(self, img):
+        return self.table.take(self.index(img))
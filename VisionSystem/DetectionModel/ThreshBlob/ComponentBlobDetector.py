@@ -0,0 +1,116 @@
+from ..DetectionResult import DetectionResult
+import cv2
+import math
+import numpy as np
+
+
+# (enabling flag, parameter name) of each filter that needs the blob's contour
+SHAPE_FILTERS = [
+    ("filterByCircularity", "Circularity"),
+    ("filterByInertia", "InertiaRatio"),
+    ("filterByConvexity", "Convexity")
+]
+
+
+
+class ComponentBlobDetector():
+
+    # blob detector built on connected-component statistics. Takes the same parameters as
+    # ThreshBlob.blob_detector_params, but finds every blob's bounding box, area and centroid in one
+    # pass over the mask, and only computes the shape measurements (which need a contour) for the
+    # blobs that survive the area filter, in decreasing order of size until the limit is met
+
+
+    def __init__(self, params):
+        # params <dict<str, val>>
+        # cv2.SimpleBlobDetector_Params-style parameters. minArea / maxArea are compared against the
+        # component's pixel count rather than its contour area
+        self.params = params
+
+
+    def detect(self, mask, limit=None):
+        n_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+
+        # label 0 is the background
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        keep = np.ones(n_labels - 1, dtype=bool)
+        if self.params.get("filterByArea", True):
+            keep &= (areas >= self.params["minArea"]) & (areas < self.params["maxArea"])
+
+        candidates = np.flatnonzero(keep) + 1
+
+        # largest bounding box first, the same ordering VisualObject uses for its results, so that
+        # a result limit can stop the search early
+        box_areas = stats[candidates, cv2.CC_STAT_WIDTH] * stats[candidates, cv2.CC_STAT_HEIGHT]
+        candidates = candidates[np.argsort(-box_areas, kind='stable')]
+
+        check_shape = self.has_shape_filters()
+        results = []
+        for label in candidates:
+            if limit is not None and len(results) >= limit:
+                break
+
+            x, y, w, h, area = stats[label]
+            if check_shape and not self.passes_shape_filters(labels[y:y + h, x:x + w] == label):
+                continue
+
+            # the far corner is exclusive, so that single-pixel-wide blobs keep a non-zero width
+            results.append(DetectionResult(
+                coords=((int(x), int(y)), (int(x + w), int(y + h))),
+                bitmask=mask,
+                centroid=(float(centroids[label][0]), float(centroids[label][1])),
+                pixel_area=int(area)
+            ))
+
+        return results
+
+
+    def has_shape_filters(self):
+        # whether any of the circularity, inertia or convexity filters can reject a blob.
+        # each measurement lies in [0, 1], so a [0, 1] range accepts everything
+        return any(
+            self.params.get(flag, True) and (self.params["min" + param] > 0 or self.params["max" + param] < 1)
+            for flag, param in SHAPE_FILTERS
+        )
+
+
+    def passes_shape_filters(self, component):
+        contours = cv2.findContours(component.astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)[-2]
+        contour = max(contours, key=len)
+        moments = cv2.moments(contour)
+        area = moments['m00']
+
+        measurements = []
+
+        if self.params.get("filterByCircularity", True):
+            perimeter = cv2.arcLength(contour, True)
+            circularity = 4 * math.pi * area / (perimeter * perimeter) if perimeter > 0 else 0
+            measurements.append(("Circularity", circularity))
+
+        if self.params.get("filterByInertia", True):
+            measurements.append(("InertiaRatio", inertia_ratio(moments)))
+
+        if self.params.get("filterByConvexity", True):
+            hull_area = cv2.contourArea(cv2.convexHull(contour))
+            convexity = area / hull_area if hull_area > 0 else 0
+            measurements.append(("Convexity", convexity))
+
+        return all(
+            self.params["min" + param] <= val < self.params["max" + param] or \
+                (val == 1 and self.params["max" + param] >= 1) # [0, 1] ranges accept perfect shapes
+            for param, val in measurements
+        )
+
+
+
+def inertia_ratio(moments):
+    # ratio of the minimum to maximum second moment of area, as computed by cv2.SimpleBlobDetector
+    denominator = math.sqrt(math.pow(2 * moments['mu11'], 2) + math.pow(moments['mu20'] - moments['mu02'], 2))
+    if denominator <= 1e-2:
+        return 1
+
+    cosmin = (moments['mu20'] - moments['mu02']) / denominator
+    sinmin = 2 * moments['mu11'] / denominator
+    imin = 0.5 * (moments['mu20'] + moments['mu02']) - 0.5 * (moments['mu20'] - moments['mu02']) * cosmin - moments['mu11'] * sinmin
+    imax = 0.5 * (moments['mu20'] + moments['mu02']) + 0.5 * (moments['mu20'] - moments['mu02']) * cosmin + moments['mu11'] * sinmin
+    return imin / imax if imax > 0 else 1
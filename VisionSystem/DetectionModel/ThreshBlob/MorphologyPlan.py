@@ -0,0 +1,210 @@
+import cv2
+from enum import Enum
+from time import perf_counter
+
+
+# Thresholder's structuring element. It is exactly the union of a 5 wide, 3 tall rectangle and a
+# 1 wide, 5 tall column, which is what lets it be decomposed into rectangles:
+#   0 0 1 0 0
+#   1 1 1 1 1
+#   1 1 1 1 1
+#   1 1 1 1 1
+#   0 0 1 0 0
+ELLIPSE_SIZE = (5, 5)
+
+# structuring elements are built once and shared by every plan
+KERNELS = {}
+
+# strategies <dict<key=(str, int, tuple), val=MorphStrategies>>
+# fastest strategy found for each (operation, iterations, mask shape), shared by every plan so
+# that each combination is only timed once
+STRATEGIES = {}
+
+# the primitive operations each step is made of
+OPERATION_PARTS = {
+    'dilate': ('dilate',),
+    'erode': ('erode',),
+    'close': ('dilate', 'erode'),
+    'open': ('erode', 'dilate')
+}
+
+
+# how many times each candidate strategy is timed when autotuning (the best time is kept)
+AUTOTUNE_REPEATS = 3
+
+
+
+class MorphStrategies(Enum):
+
+    # iterations of the 5x5 ellipse in a single cv2.dilate / cv2.erode call
+    Iterate = 1
+
+    # each iteration as the max (dilation) or min (erosion) of a 5x3 rectangle and a 1x5 column,
+    # both of which OpenCV applies as separable row and column filters
+    Split = 2
+
+    # n iterations of the ellipse are the union of n + 1 rectangles, (4i + 1) wide and
+    # (4n - 2i + 1) tall, so the whole operation is one separable filter per rectangle
+    Rectangles = 3
+
+
+
+class MorphologyPlan():
+
+    # the four erosion / dilation settings of a Thresholder, compiled into as few OpenCV calls as
+    # possible. Zero stages are dropped, neighbouring stages of the same operation are merged into
+    # one with their iterations summed, and a dilation followed by an equal erosion (or vice versa)
+    # becomes a single close (or open). Every step is exactly equivalent to the stages it replaces,
+    # as OpenCV pads with values that never affect a dilation or erosion
+
+    def __init__(self, dilation1=0, erosion1=0, dilation2=0, erosion2=0, autotune=True):
+        # steps <[(str, int)]>
+        # (operation, iterations) in the order they are applied. Operations are 'dilate',
+        # 'erode', 'close' or 'open'
+        self.steps = compile_steps([
+            ('dilate', dilation1),
+            ('erode', erosion1),
+            ('dilate', dilation2),
+            ('erode', erosion2)
+        ])
+
+        # autotune <bool>
+        # whether to time every strategy on the first mask of each shape and use the fastest,
+        # rather than always iterating the ellipse
+        self.autotune = autotune
+
+        # timings <[[int, float]]>
+        # number of calls and total time spent in each step, for report()
+        self.timings = [[0, 0.] for _ in self.steps]
+
+        # shape of the last mask applied to, which the strategies in report() are for
+        self.shape = None
+
+
+    def apply(self, mask):
+        self.shape = mask.shape
+        for step_idx, (operation, iterations) in enumerate(self.steps):
+            # looked up (and autotuned if need be) before the step is timed
+            strategies = [self.strategy(part, iterations, mask) for part in OPERATION_PARTS[operation]]
+            start = perf_counter()
+
+            if len(strategies) == 2 and all(strategy is MorphStrategies.Iterate for strategy in strategies):
+                morph_op = cv2.MORPH_CLOSE if operation == 'close' else cv2.MORPH_OPEN
+                mask = cv2.morphologyEx(mask, morph_op, ellipse(), iterations=iterations)
+            else:
+                for part, strategy in zip(OPERATION_PARTS[operation], strategies):
+                    mask = STRATEGY_FNS[strategy](part, iterations, mask)
+
+            self.timings[step_idx][0] += 1
+            self.timings[step_idx][1] += perf_counter() - start
+
+        return mask
+
+
+    def strategy(self, operation, iterations, mask):
+        if not self.autotune:
+            return MorphStrategies.Iterate
+
+        key = (operation, iterations, mask.shape)
+        if key not in STRATEGIES:
+            STRATEGIES[key] = fastest_strategy(operation, iterations, mask)
+        return STRATEGIES[key]
+
+
+    def report(self):
+        # how long each step has taken on average, in the order they are applied
+        return [
+            {
+                "step": "%s(%d)" % (operation, iterations),
+                "strategies": [
+                    STRATEGIES[(part, iterations, self.shape)].name
+                    if (part, iterations, self.shape) in STRATEGIES else MorphStrategies.Iterate.name
+                    for part in OPERATION_PARTS[operation]
+                ],
+                "calls": calls,
+                "mean_time": total_time / calls if calls else 0
+            } for (operation, iterations), (calls, total_time) in zip(self.steps, self.timings)
+        ]
+
+
+    def __len__(self):
+        return len(self.steps)
+
+
+
+def compile_steps(stages):
+    merged = []
+    for operation, iterations in stages:
+        if iterations <= 0:
+            continue
+        if merged and merged[-1][0] == operation:
+            merged[-1] = (operation, merged[-1][1] + iterations)
+        else:
+            merged.append((operation, iterations))
+
+    steps = []
+    for operation, iterations in merged:
+        if steps and steps[-1][1] == iterations and (steps[-1][0], operation) in (('dilate', 'erode'), ('erode', 'dilate')):
+            steps[-1] = ('close' if operation == 'erode' else 'open', iterations)
+        else:
+            steps.append((operation, iterations))
+    return steps
+
+
+def kernel(shape, size):
+    key = (shape, size)
+    if key not in KERNELS:
+        KERNELS[key] = cv2.getStructuringElement(shape, size)
+    return KERNELS[key]
+
+
+def ellipse():
+    return kernel(cv2.MORPH_ELLIPSE, ELLIPSE_SIZE)
+
+
+def rect(width, height):
+    return kernel(cv2.MORPH_RECT, (width, height))
+
+
+def iterate(operation, iterations, mask):
+    morph_fn = cv2.dilate if operation == 'dilate' else cv2.erode
+    return morph_fn(mask, ellipse(), iterations=iterations)
+
+
+def split(operation, iterations, mask):
+    morph_fn, combine_fn = (cv2.dilate, cv2.max) if operation == 'dilate' else (cv2.erode, cv2.min)
+    for _ in range(iterations):
+        mask = combine_fn(morph_fn(mask, rect(5, 3)), morph_fn(mask, rect(1, 5)))
+    return mask
+
+
+def rectangles(operation, iterations, mask):
+    morph_fn, combine_fn = (cv2.dilate, cv2.max) if operation == 'dilate' else (cv2.erode, cv2.min)
+    result = None
+    for i in range(iterations + 1):
+        part = morph_fn(mask, rect(4 * i + 1, 4 * (iterations - i) + 2 * i + 1))
+        result = part if result is None else combine_fn(result, part, dst=result)
+    return result
+
+
+STRATEGY_FNS = {
+    MorphStrategies.Iterate: iterate,
+    MorphStrategies.Split: split,
+    MorphStrategies.Rectangles: rectangles
+}
+
+
+def fastest_strategy(operation, iterations, mask):
+    best_strategy, best_time = None, None
+    for strategy, strategy_fn in STRATEGY_FNS.items():
+        strategy_time = None
+        for _ in range(AUTOTUNE_REPEATS):
+            start = perf_counter()
+            strategy_fn(operation, iterations, mask)
+            elapsed = perf_counter() - start
+            strategy_time = elapsed if strategy_time is None else min(strategy_time, elapsed)
+
+        if best_time is None or strategy_time < best_time:
+            best_strategy, best_time = strategy, strategy_time
+
+    return best_strategy
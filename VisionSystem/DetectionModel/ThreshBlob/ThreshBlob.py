@@ -1,14 +1,34 @@
 from ..DetectionModel import DetectionModel
 from ..DetectionResult import DetectionResult
 from .Thresholder import Thresholder
+from .ComponentBlobDetector import ComponentBlobDetector
+from enum import Enum
 import cv2
 import pickle
 import numpy as np
+import Instrumentation
+
+
+
+class BlobEngines(Enum):
+
+    # cv2.SimpleBlobDetector, then findContours around each keypoint for its bounding box
+    SimpleBlobDetector = 1
+
+    # cv2.connectedComponentsWithStats, see ComponentBlobDetector
+    ConnectedComponents = 2
+
 
 
 class ThreshBlob(DetectionModel):
 
-    def __init__(self, thresholder=None, blob_detector_params=None):
+    # class-level defaults so that models pickled before these options existed still load
+    blob_engine = BlobEngines.SimpleBlobDetector
+    _blob_detector = None
+    _blob_detector_key = None
+
+
+    def __init__(self, thresholder=None, blob_detector_params=None, blob_engine=BlobEngines.SimpleBlobDetector):
 
         # thresholder <Thresholder>
         # the thresholder to be applied to the image before finding blobs
@@ -35,17 +55,58 @@ class ThreshBlob(DetectionModel):
         self.blob_detector_params["filterByArea"] = True
         self.blob_detector_params["filterByCircularity"] = True
 
+        # blob_engine <BlobEngines>
+        # the algorithm used to find blobs in the thresholded mask
+        self.blob_engine = blob_engine
+
+
+    def __getstate__(self):
+        # blob detector instances can't be pickled, and are cheap to rebuild
+        return {key: val for key, val in self.__dict__.items() if not key.startswith('_')}
+
+
+    def to_dict(self):
+        # parameters only, as plain JSON types, see ModelFormat
+        return {
+            "thresholder": self.thresholder.to_dict(),
+            # values set from the tuner's trackbars may be numpy scalars
+            "blob_detector_params": {
+                name: val.item() if isinstance(val, np.generic) else val
+                for name, val in self.blob_detector_params.items()
+            },
+            "blob_engine": self.blob_engine.name
+        }
 
-    def apply(self, frame):
-        mask = self.thresholder.apply(frame)
-        height, width = mask.shape
-        params = cv2.SimpleBlobDetector_Params()
-        for name, val in self.blob_detector_params.items():
-            setattr(params, name, val)
-        blob_detector = cv2.SimpleBlobDetector_create(params)
 
+    @staticmethod
+    def from_dict(params):
+        return ThreshBlob(Thresholder.from_dict(params["thresholder"]), dict(params["blob_detector_params"]),
+            BlobEngines[params["blob_engine"]])
+
+
+    def prepare(self, source):
+        self.thresholder.prepare(source)
+        self.blob_detector()
+
+
+    def apply(self, frame, mask=None, limit=None):
+        mask = self.thresholder.apply(frame, mask=mask)
+
+        start = Instrumentation.start()
+        results = self.find_blobs(mask, limit=limit)
+        Instrumentation.stop("blobs", start)
+        return results
+
+
+    def find_blobs(self, mask, limit=None):
+        # limit <int?>
+        # the most results wanted, largest first. Only the ConnectedComponents engine uses it
+        if self.blob_engine is BlobEngines.ConnectedComponents:
+            return self.blob_detector().detect(mask, limit=limit)
+
+        height, width = mask.shape
         results = []
-        for keypoint in blob_detector.detect(mask):
+        for keypoint in self.blob_detector().detect(mask):
             x, y = keypoint.pt
             x, y = int(x), int(y)
 
@@ -63,11 +124,12 @@ class ThreshBlob(DetectionModel):
 
             (x1, y1), (x2, y2) = find_bounding_box(contours)
 
-            # restore the offsets invoked by ROI-based contour detection
+            # restore the offsets invoked by ROI-based contour detection, and make the far corner
+            # exclusive like the ConnectedComponents engine's (see DetectionResult.coords)
             x1 += roi[1][0]
-            x2 += roi[1][0]
+            x2 += roi[1][0] + 1
             y1 += roi[0][0]
-            y2 += roi[0][0]
+            y2 += roi[0][0] + 1
 
             results.append(DetectionResult(
                 coords=((x1, y1), (x2, y2)),
@@ -77,22 +139,38 @@ class ThreshBlob(DetectionModel):
         return results
 
 
+    def blob_detector(self):
+        # the detector is rebuilt only when the engine or its parameters change (eg. from the tuner)
+        key = (self.blob_engine, tuple(sorted(self.blob_detector_params.items())))
+        if self._blob_detector is None or self._blob_detector_key != key:
+            if self.blob_engine is BlobEngines.ConnectedComponents:
+                self._blob_detector = ComponentBlobDetector(self.blob_detector_params)
+            else:
+                params = cv2.SimpleBlobDetector_Params()
+                for name, val in self.blob_detector_params.items():
+                    setattr(params, name, val)
+                self._blob_detector = cv2.SimpleBlobDetector_create(params)
+            self._blob_detector_key = key
+        return self._blob_detector
+
+
 
 def find_bounding_box(contours):
     # find the rectangle that includes all points in the contour
     x1, y1 = 99999999, 999999999
     x2, y2 = -99999999, -999999999
 
+    # both bounds are checked against every point, as a single point can be both
     for contour in contours:
         for [[cx, cy]] in contour:
             if x1 > cx:
                 x1 = cx
-            elif x2 < cx:
+            if x2 < cx:
                 x2 = cx
             
             if y1 > cy:
                 y1 = cy
-            elif y2 < cy:
+            if y2 < cy:
                 y2 = cy
 
     return (x1, y1), (x2, y2)
\ No newline at end of file
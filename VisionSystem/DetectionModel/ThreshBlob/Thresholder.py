@@ -1,13 +1,28 @@
 import cv2
 from ..Frame import Frame
 from ..ColorSpace import ColorSpace, ColorSpaces, ColorSpaceScale
+from .ColorLUT import ColorLUT
+from .MorphologyPlan import MorphologyPlan
+from ..ArtefactCache import artefact_cache
 import numpy as np
 from copy import copy
+import Instrumentation
 
 
 class Thresholder():
 
-    def __init__(self, colorspace=ColorSpaces.BGR, lower=None, upper=None, erosion1=0, dilation1=0, erosion2=0, dilation2=0):
+    # class-level defaults so that thresholders pickled before these options existed
+    # still load with compilation turned off
+    compiled = False
+    lut_bits = (6, 6, 6)
+    _lut = None
+    _lut_key = None
+    _morphology_plan = None
+    _morphology_plan_key = None
+
+
+    def __init__(self, colorspace=ColorSpaces.BGR, lower=None, upper=None, erosion1=0, dilation1=0, erosion2=0, dilation2=0,
+            compiled=False, lut_bits=None):
         # colorspace <ColorSpace>
         # the colorspace in which the threshold resides
         if colorspace in ColorSpaces:
@@ -32,13 +47,75 @@ class Thresholder():
         self.dilation2 = dilation2
         self.erosion2 = erosion2
 
+        # compiled <bool>
+        # whether to threshold with a lookup table indexed directly by BGR value instead of
+        # converting each frame to the colorspace first. Only used when applied to a Frame
+        self.compiled = compiled
 
-    def apply(self, frame):
-        if type(frame) is Frame:
-            colorspace_img = frame.get(self.colorspace)
-        else:
-            colorspace_img = frame
+        # lut_bits <tuple<int, int, int>>
+        # per-channel quantization of the lookup table, see ColorLUT
+        self.lut_bits = tuple(lut_bits or Thresholder.lut_bits)
+
+
+    def __getstate__(self):
+        # compiled artefacts are cheap to rebuild, so keep them out of saved models
+        return {key: val for key, val in self.__dict__.items() if not key.startswith('_')}
+
+
+    def to_dict(self):
+        # parameters only, as plain JSON types, see ModelFormat
+        return {
+            "colorspace": self.colorspace.name,
+            "lower": [int(val) for val in self.lower],
+            "upper": [int(val) for val in self.upper],
+            "erosion1": int(self.erosion1),
+            "dilation1": int(self.dilation1),
+            "erosion2": int(self.erosion2),
+            "dilation2": int(self.dilation2),
+            "compiled": bool(self.compiled),
+            "lut_bits": [int(bits) for bits in self.lut_bits]
+        }
+
+
+    @staticmethod
+    def from_dict(params):
+        return Thresholder(ColorSpaces[params["colorspace"]], list(params["lower"]), list(params["upper"]),
+            params["erosion1"], params["dilation1"], params["erosion2"], params["dilation2"],
+            params["compiled"], params["lut_bits"])
+
+
+    def apply(self, frame, mask=None):
+        # mask <np.array<uint8>?>
+        # an already colour-thresholded mask for this frame (eg. a bit plane of the VisionSystem's
+        # fused label image). Only the morphology stages are applied to it
+        if mask is None:
+            start = Instrumentation.start()
+            if self.compiled and type(frame) is Frame and frame.source.name != self.colorspace.name:
+                # frames captured in this colorspace already threshold without any conversion
+                mask = self.compiled_lut(frame.source).apply(frame.get(frame.source))
+            else:
+                if type(frame) is Frame:
+                    colorspace_img = frame.get(self.colorspace)
+                else:
+                    colorspace_img = frame
+                mask = self.threshold(colorspace_img)
+            Instrumentation.stop("threshold", start)
 
+        start = Instrumentation.start()
+        mask = self.morphology_plan().apply(mask)
+        Instrumentation.stop("morphology", start)
+        return mask
+
+
+    def prepare(self, source):
+        # builds the lookup table (if compiled) and morphology plan that apply() would
+        if self.compiled and source.name != self.colorspace.name:
+            self.compiled_lut(source)
+        self.morphology_plan()
+
+
+    def threshold(self, colorspace_img):
+        # colour thresholding only (no morphology) of an image already in this colorspace
         has_radial = any([lower < 0 for (lower, _) in self.colorspace.channel_limits])
         has_negative_val = False # until proven true, only possible if there is a radial val    
 
@@ -65,17 +142,34 @@ class Thresholder():
         else:
             mask = cv2.inRange(colorspace_img, np.array(self.lower, dtype=np.uint8), np.array(self.upper, dtype=np.uint8))
 
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
-        if self.dilation1 > 0:
-            mask = cv2.dilate(mask, kernel, iterations=self.dilation1)
-        if self.erosion1 > 0:
-            mask = cv2.erode(mask, kernel, iterations=self.erosion1)
-        if self.dilation2 > 0:
-            mask = cv2.dilate(mask, kernel, iterations=self.dilation2)
-        if self.erosion2 > 0:
-            mask = cv2.erode(mask, kernel, iterations=self.erosion2)
         return mask
 
 
+    def compiled_lut(self, source=ColorSpaces.BGR):
+        # source: the colorspace of the frames the table will be indexed by.
+        # the lookup table is rebuilt only when the colorspace, bounds, quantization or source change.
+        # the tuner assigns thresh.colorspace directly, so compare a cheap key rather than
+        # relying on update() alone
+        key = self.lut_key() + (source.name,)
+        if self._lut is None or self._lut_key != key:
+            self._lut = ColorLUT(self.lut_bits, source).compile([self], cache=artefact_cache())
+            self._lut_key = key
+        return self._lut
+
+
+    def morphology_plan(self):
+        # recompiled whenever the tuner changes one of the erosion / dilation settings
+        key = (self.dilation1, self.erosion1, self.dilation2, self.erosion2)
+        if self._morphology_plan is None or self._morphology_plan_key != key:
+            self._morphology_plan = MorphologyPlan(*key)
+            self._morphology_plan_key = key
+        return self._morphology_plan
+
+
+    def lut_key(self):
+        return (self.colorspace.name, tuple(self.lower), tuple(self.upper), tuple(self.lut_bits))
+
+
     def update(self, channel_idx, new_range):
-        self.lower[channel_idx], self.upper[channel_idx] = new_range
\ No newline at end of file
+        self.lower[channel_idx], self.upper[channel_idx] = new_range
+        self._lut = None
\ No newline at end of file
@@ -1,3 +1,6 @@
 # re-exports
 from .Thresholder import Thresholder
-from .ThreshBlob import ThreshBlob
\ No newline at end of file
+from .ColorLUT import ColorLUT
+from .MorphologyPlan import MorphologyPlan, MorphStrategies
+from .ThreshBlob import ThreshBlob, BlobEngines
+from .ComponentBlobDetector import ComponentBlobDetector
\ No newline at end of file
@@ -2,4 +2,6 @@ from .DetectionModel import DetectionModel
 from .ThreshBlob import ThreshBlob
 from .DetectionResult import DetectionResult
 from .ColorSpace import ColorSpace, ColorSpaces, ColorSpaceScale
-from .Frame import Frame
\ No newline at end of file
+from .Frame import Frame, FramePool
+from .ModelFormat import load_model, save_model, convert_pickle, MODEL_FORMAT_VERSION
+from .ArtefactCache import ArtefactCache, artefact_cache
\ No newline at end of file
@@ -0,0 +1,68 @@
+from threading import Lock
+
+
+# an object is due once this fraction of its interval has passed, so that jitter in frame
+# timestamps doesn't make it wait a whole extra frame
+DUE_FRACTION = 0.9
+
+
+# Decides which tracked objects are detected on each frame, so that the CPU goes to the objects
+# that matter right now. Each object has a target detection rate, scaled by a priority that the
+# navigation state machine raises or lowers as it changes state. Objects that aren't due keep
+# their last results, which VisualObject.updated_at says the age of
+class DetectionScheduler():
+
+    def __init__(self, rates=None, priorities=None):
+        # rates <dict<key=str, val=float?>>
+        # target detections per second of each object at priority 1. Objects without a rate
+        # (or a rate of None) are detected on every frame while their priority is above 0
+        self.rates = dict(rates or {})
+
+        # priorities <dict<key=str, val=float>>
+        # multiplies each object's rate, 1 if not given. 0 stops detecting the object altogether
+        self.priorities = dict(priorities or {})
+
+        # last_detected <dict<key=str, val=float>>
+        # timestamp of the frame each object was last detected on
+        self.last_detected = {}
+
+        # navigation may change priorities from another thread (eg. a pipeline stage)
+        self.lock = Lock()
+
+
+    def set_priorities(self, priorities):
+        # priorities <dict<key=str, val=float>>
+        # new priorities for the given objects. Others keep theirs
+        with self.lock:
+            self.priorities.update(priorities)
+
+
+    def interval(self, name):
+        # seconds between detections of the object, None if it isn't detected at all
+        with self.lock:
+            priority = self.priorities.get(name, 1)
+        rate = self.rates.get(name)
+
+        if priority <= 0:
+            return None
+        if rate is None:
+            return 0
+        return 1 / (rate * priority)
+
+
+    def due(self, names, timestamp):
+        # the objects to detect on a frame taken at timestamp, in the order given.
+        # Marks them as detected
+        due_names = []
+        for name in names:
+            interval = self.interval(name)
+            last = self.last_detected.get(name)
+            # objects never detected are always due, whatever their priority
+            if last is None or (interval is not None and timestamp - last >= interval * DUE_FRACTION):
+                due_names.append(name)
+                self.last_detected[name] = timestamp
+        return due_names
+
+
+    def reset(self):
+        self.last_detected = {}
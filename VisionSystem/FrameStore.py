@@ -0,0 +1,115 @@
+import os
+import json
+import cv2
+import numpy as np
+from .DetectionModel import Frame, ColorSpaces
+
+
+# Recording converted once into memory-mapped, already downsampled frames, optionally with the
+# frames' planes in other colorspaces precomputed, so that offline tuning and profiling never
+# decode or convert the same clip twice. Stored as a directory of one .npy file per colorspace
+class FrameStore():
+
+    META_FILENAME = "meta.json"
+    FORMAT_VERSION = 1
+
+
+    def __init__(self, path):
+        # path <str>
+        # directory written by FrameStore.convert()
+        self.path = path
+
+        with open(os.path.join(path, self.META_FILENAME)) as meta_file:
+            meta = json.load(meta_file)
+
+        if meta["version"] != self.FORMAT_VERSION:
+            raise Exception("frame store at %s is version %d, expected %d" % (path, meta["version"], self.FORMAT_VERSION))
+
+        self.frame_count = meta["frame_count"]
+        self.fps = meta["fps"]
+        self.resolution = tuple(meta["resolution"])
+
+        # planes <dict<key=ColorSpaces, val=np.memmap<uint8>>>
+        # (frame_count, height, width, 3) images of every frame in each stored colorspace.
+        # mapped copy-on-write, so frames can still be drawn on without touching the file
+        self.planes = {
+            ColorSpaces[name]: np.load(plane_path(path, ColorSpaces[name]), mmap_mode='c')[:self.frame_count]
+            for name in meta["colorspaces"]
+        }
+
+
+    def __len__(self):
+        return self.frame_count
+
+
+    def read_frame(self, frame_idx):
+        if not 0 <= frame_idx < self.frame_count:
+            raise IndexError("frame %d is not in the frame store" % frame_idx)
+
+        frame = Frame(self.planes[ColorSpaces.BGR][frame_idx])
+        for colorspace, plane in self.planes.items():
+            frame.link(colorspace, plane[frame_idx])
+        frame.seq = frame_idx
+        return frame
+
+
+    @staticmethod
+    def convert(video_path, store_path, downsample_scale=1, colorspaces=(), progress=True):
+        # colorspaces <[ColorSpaces]>
+        # colorspaces to precompute planes for, in addition to BGR
+        from .VideoStream import VideoStream
+        from tqdm import tqdm
+
+        stream = VideoStream(video_path, downsample_scale=downsample_scale, cache_bytes=0)
+        frame_count = int(stream.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        width, height = stream.resolution
+        colorspaces = [ColorSpaces.BGR] + [colorspace for colorspace in colorspaces if colorspace is not ColorSpaces.BGR]
+
+        os.makedirs(store_path, exist_ok=True)
+        planes = {
+            colorspace: np.lib.format.open_memmap(
+                plane_path(store_path, colorspace), mode='w+', dtype=np.uint8, shape=(frame_count, height, width, 3)
+            ) for colorspace in colorspaces
+        }
+
+        # the container's frame count is only an estimate, so count what is actually decoded
+        written = 0
+        for frame in tqdm(stream, total=frame_count, disable=not progress):
+            if written >= frame_count:
+                break
+            bgr_img = frame.get()
+            for colorspace, plane in planes.items():
+                if colorspace is ColorSpaces.BGR:
+                    plane[written] = bgr_img
+                else:
+                    plane[written] = colorspace.value.bgr2this(bgr_img)
+            written += 1
+
+        for plane in planes.values():
+            plane.flush()
+        fps = stream.cap.get(cv2.CAP_PROP_FPS)
+        stream.close()
+
+        with open(os.path.join(store_path, FrameStore.META_FILENAME), 'w') as meta_file:
+            json.dump({
+                "version": FrameStore.FORMAT_VERSION,
+                "source": os.path.abspath(video_path),
+                "downsample_scale": downsample_scale,
+                "frame_count": written,
+                "fps": fps,
+                "resolution": [width, height],
+                "colorspaces": [colorspace.name for colorspace in colorspaces]
+            }, meta_file, indent=4)
+
+        return FrameStore(store_path)
+
+
+    @staticmethod
+    def is_frame_store(path):
+        return os.path.isfile(os.path.join(path, FrameStore.META_FILENAME))
+
+
+
+def plane_path(store_path, colorspace):
+    return os.path.join(store_path, colorspace.name + ".npy")
+
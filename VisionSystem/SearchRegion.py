@@ -0,0 +1,75 @@
+import cv2
+import numpy as np
+
+
+# Part of the frame an object can appear in, so that its detection only has to look at the
+# smallest crop of the frame that covers it (eg. the ball is never above the horizon).
+# All coordinates are normalized, 0 being the top / left edge of the frame and 1 the bottom / right
+class SearchRegion():
+
+    def __init__(self, rows=(0, 1), cols=(0, 1), polygon=None):
+        # rows <tuple<float, float>>
+        # top and bottom of the band of rows to search
+        self.rows = tuple(rows)
+
+        # cols <tuple<float, float>>
+        # left and right of the band of columns to search
+        self.cols = tuple(cols)
+
+        # polygon <[tuple<float, float>]?>
+        # (x, y) vertices of the area to search, within the row / column bands. Detection runs on
+        # the polygon's bounding box, and any result whose centre is outside the polygon is dropped
+        self.polygon = [tuple(vertex) for vertex in polygon] if polygon else None
+
+        if not (0 <= self.rows[0] < self.rows[1] <= 1 and 0 <= self.cols[0] < self.cols[1] <= 1):
+            raise Exception("search region rows and cols must be increasing ranges within [0, 1]")
+
+        self.pixel_cache = {}
+
+
+    def __getstate__(self):
+        return {key: val for key, val in self.__dict__.items() if key != 'pixel_cache'}
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.pixel_cache = {}
+
+
+    def bounds(self, width, height):
+        # (x1, y1, x2, y2) pixel bounds of the crop to search in a width x height frame,
+        # the far corner being exclusive
+        return self.pixels(width, height)[0]
+
+
+    def contains(self, point, width, height):
+        # whether the (x, y) pixel coords lie in the region
+        (x1, y1, x2, y2), pixel_polygon = self.pixels(width, height)
+        x, y = point
+        if not (x1 <= x < x2 and y1 <= y < y2):
+            return False
+        return pixel_polygon is None or cv2.pointPolygonTest(pixel_polygon, (float(x), float(y)), False) >= 0
+
+
+    def is_full_frame(self):
+        return self.polygon is None and self.rows == (0, 1) and self.cols == (0, 1)
+
+
+    def pixels(self, width, height):
+        # the region in pixels is the same for every frame of a stream, so it is only worked out
+        # once per frame size
+        if (width, height) not in self.pixel_cache:
+            x1, x2 = [int(round(col * width)) for col in self.cols]
+            y1, y2 = [int(round(row * height)) for row in self.rows]
+
+            pixel_polygon = None
+            if self.polygon is not None:
+                pixel_polygon = np.array(
+                    [(x * width, y * height) for x, y in self.polygon], dtype=np.float32
+                ).reshape(-1, 1, 2)
+                px, py, pw, ph = cv2.boundingRect(pixel_polygon)
+                x1, y1 = max(x1, px), max(y1, py)
+                x2, y2 = min(x2, px + pw), min(y2, py + ph)
+
+            self.pixel_cache[(width, height)] = ((x1, y1, max(x1, x2), max(y1, y2)), pixel_polygon)
+        return self.pixel_cache[(width, height)]
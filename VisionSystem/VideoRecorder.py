@@ -0,0 +1,116 @@
+import cv2
+import numpy as np
+from threading import Thread
+from Pipeline import BoundedQueue, QueuePolicies, QueueClosed
+
+
+
+# Records frames to video on its own thread, so that labelling and encoding them doesn't hold up
+# the control loop. Frames are handed over through a bounded queue, and once it is full the
+# queue's policy decides whether the oldest frame is dropped (the default) or the loop waits.
+# OpenCV releases the GIL while encoding, so a thread gets the encoder off the loop's core
+# without copying every frame to another process
+class VideoRecorder():
+
+    def __init__(self, path_prefix, resolution, fps=20.0, fourcc="XVID", raw=True, label=None,
+            maxsize=4, policy=QueuePolicies.DropOldest, keep_latest=False):
+        # path_prefix <str>
+        # videos are written to <path_prefix>_raw.avi and <path_prefix>_labelled.avi, and the
+        # sequence number and capture time of every frame written to <path_prefix>_index.csv, so
+        # that frames in the video can be matched up with the live run despite any dropped
+        self.path_prefix = path_prefix
+
+        # raw <bool>
+        # whether to record the frames as captured as well as labelled
+        self.raw = raw
+
+        # label <(Frame, snapshot) -> None?>
+        # draws onto a frame's BGR image (eg. VisionSystem.label_frame) before it is recorded to
+        # the labelled video. None records no labelled video
+        self.label = label
+
+        # keep_latest <bool>
+        # whether to keep a copy of the last labelled image, eg. for showing on screen
+        self.keep_latest = keep_latest
+        self.latest = None
+
+        # encoded <int>
+        # frames written so far. Those dropped are counted by dropped()
+        self.encoded = 0
+
+        fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.writers = []
+        if raw:
+            self.raw_writer = self.open_writer(path_prefix + "_raw.avi", fourcc, fps, resolution)
+        if label is not None:
+            self.labelled_writer = self.open_writer(path_prefix + "_labelled.avi", fourcc, fps, resolution)
+        self.index_file = open(path_prefix + "_index.csv", 'w')
+        self.index_file.write("video_frame,seq,timestamp\n")
+
+        # frames dropped by the queue are released straight away, so their buffers are reused
+        self.queue = BoundedQueue(maxsize, policy, on_drop=lambda item: item[0].release())
+        self.thread = Thread(target=self.run, name="VideoRecorder", daemon=True)
+        self.thread.start()
+
+
+    def open_writer(self, path, fourcc, fps, resolution):
+        writer = cv2.VideoWriter(path, fourcc, fps, tuple(resolution))
+        if not writer.isOpened():
+            raise Exception("can't record video to %s" % path)
+        self.writers.append(writer)
+        return writer
+
+
+    def record(self, frame, snapshot=None):
+        # queues frame to be recorded, taking it over: it is released once recorded or dropped,
+        # so the caller mustn't use it afterwards
+        # snapshot: the results to label it with, as returned by VisionSystem.snapshot()
+        try:
+            self.queue.put((frame, snapshot))
+        except QueueClosed:
+            frame.release()
+
+
+    def run(self):
+        while True:
+            try:
+                frame, snapshot = self.queue.get()
+            except QueueClosed:
+                return
+
+            try:
+                self.write(frame, snapshot)
+            finally:
+                frame.release()
+
+
+    def write(self, frame, snapshot):
+        if self.raw:
+            self.raw_writer.write(frame.get())
+        if self.label is not None:
+            self.label(frame, snapshot)
+            img = frame.get()
+            self.labelled_writer.write(img)
+            if self.keep_latest:
+                self.latest = np.copy(img)
+
+        self.index_file.write("%d,%s,%.6f\n" % (self.encoded, "" if frame.seq is None else frame.seq, frame.timestamp))
+        self.encoded += 1
+
+
+    def dropped(self):
+        # frames dropped by the queue's policy so far
+        return self.queue.dropped
+
+
+    def stats(self):
+        return {"encoded": self.encoded, "dropped": self.dropped(), "queued": len(self.queue)}
+
+
+    def close(self):
+        # records the frames still queued, then finishes the videos
+        self.queue.close()
+        self.thread.join()
+        for writer in self.writers:
+            writer.release()
+        self.index_file.close()
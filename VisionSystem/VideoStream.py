@@ -1,25 +1,215 @@
 import cv2
-from threading import Thread, Lock
+from threading import Thread, Condition
+from functools import partial
+from collections import OrderedDict
+from enum import Enum
 import numpy as np
-from .DetectionModel import Frame
-from time import time
+from .DetectionModel import Frame, FramePool, ColorSpaces
+from .FrameStore import FrameStore
+from time import time, perf_counter
+import Instrumentation
+import Hardware
 try:
     from picamera import PiCamera, PiResolution
     PICAMERA_MODE = True
 except Exception:
     PICAMERA_MODE = False
-    
+
 
 PI_CAM_SENSOR_MODE = 5
 PI_CAM_RESOLUTION = (1640, 922)
 
+
+
+class ReadModes(Enum):
+
+    # each read returns the newest captured frame, skipping any that were never read
+    Latest = 1
+
+    # each read returns the frame captured after the last one read. Capture waits for the
+    # reader rather than skip a frame
+    Sequential = 2
+
+
+
+# Fixed set of preallocated frame buffers shared between the capture thread and its readers
+class FrameRing():
+
+    def __init__(self, size, shape):
+        # buffers <[np.array<uint8>]>
+        # the capture thread writes straight into these, so no frame is allocated after start-up
+        self.buffers = [np.empty(shape, dtype=np.uint8) for _ in range(size)]
+
+        # seqs <[int]>
+        # sequence number of the frame held in each buffer, -1 if it holds none
+        self.seqs = [-1] * size
+
+        # leases <[int]>
+        # number of frames handed out and not yet released for each buffer. Leased buffers are
+        # never written to, so a reader can't see a frame torn by the next capture
+        self.leases = [0] * size
+
+        # stamps <[float]>
+        # perf_counter() time each buffer's frame was captured
+        self.stamps = [0.] * size
+
+        self.last_seq = -1 # sequence number of the newest complete frame
+        self.read_seq = -1 # sequence number of the last frame handed out
+        self.cond = Condition()
+        self.stopped = False
+
+
+    def acquire_write(self, sequential):
+        # blocks until there is a buffer the capture thread may overwrite, and returns its index,
+        # or None once stopped
+        with self.cond:
+            while not self.stopped:
+                free = [
+                    idx for idx in range(len(self.buffers))
+                    if self.leases[idx] == 0 and (self.seqs[idx] < 0 or self.seqs[idx] != self.last_seq) and \
+                        (not sequential or self.seqs[idx] <= self.read_seq)
+                ]
+                if free:
+                    idx = min(free, key=lambda idx: self.seqs[idx]) # oldest first
+                    self.seqs[idx] = -1
+                    return idx
+                self.cond.wait()
+            return None
+
+
+    def publish(self, idx, timestamp):
+        with self.cond:
+            self.last_seq += 1
+            self.seqs[idx] = self.last_seq
+            self.stamps[idx] = timestamp
+            self.cond.notify_all()
+
+
+    def read(self, sequential):
+        # blocks until there is an unread frame, and returns the index and sequence number of the
+        # buffer holding it, leased to the caller until release()
+        with self.cond:
+            while True:
+                if sequential:
+                    ready = [idx for idx, seq in enumerate(self.seqs) if seq == self.read_seq + 1]
+                else:
+                    ready = [idx for idx, seq in enumerate(self.seqs) if seq > self.read_seq]
+
+                if ready:
+                    idx = max(ready, key=lambda idx: self.seqs[idx])
+                    self.leases[idx] += 1
+                    self.read_seq = self.seqs[idx]
+                    self.cond.notify_all()
+                    return idx, self.read_seq
+
+                if self.stopped:
+                    raise StopIteration
+                self.cond.wait()
+
+
+    def wait_for_frame(self, timeout=None):
+        # blocks until the first frame has been captured, returning whether it was
+        with self.cond:
+            return self.cond.wait_for(lambda: self.last_seq >= 0 or self.stopped, timeout) and self.last_seq >= 0
+
+
+    def release(self, idx):
+        with self.cond:
+            self.leases[idx] -= 1
+            self.cond.notify_all()
+
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+
+
+
+# Turns planar YUV420 (I420) camera output into a YCrCb image, the only per-frame work left when
+# capturing in the camera's native colorspace
+class I420Unpacker():
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+        # chroma_shape <tuple<int, int>>
+        # (height, width) of the U and V planes: half the image's, rounded up as I420 does for odd
+        # sizes (eg. the 205x115 off-robot stream)
+        self.chroma_shape = ((height + 1) // 2, (width + 1) // 2)
+        self.y_size = width * height
+        self.c_size = self.chroma_shape[0] * self.chroma_shape[1]
+
+        # raw <np.array<uint8>>
+        # one full I420 capture: the Y plane, then the quarter-size U and V planes
+        self.raw = np.empty(self.y_size + 2 * self.c_size, dtype=np.uint8)
+
+        # upsampled chroma planes, reused every frame
+        self.cr = np.empty((height, width), dtype=np.uint8)
+        self.cb = np.empty((height, width), dtype=np.uint8)
+
+
+    def unpack(self, raw, dst):
+        # dst: the (height, width, 3) YCrCb image to write into
+        y_size, c_size, chroma_shape = self.y_size, self.c_size, self.chroma_shape
+
+        y = raw[:y_size].reshape(self.height, self.width)
+        u = raw[y_size:y_size + c_size].reshape(chroma_shape)
+        v = raw[y_size + c_size:y_size + 2 * c_size].reshape(chroma_shape)
+
+        cv2.resize(v, (self.width, self.height), dst=self.cr, interpolation=cv2.INTER_NEAREST)
+        cv2.resize(u, (self.width, self.height), dst=self.cb, interpolation=cv2.INTER_NEAREST)
+        return cv2.merge([y, self.cr, self.cb], dst)
+
+
+    def from_bgr(self, bgr_img, dst):
+        # synthetic camera: packs a BGR image into full-range I420, the way the camera's video port
+        # does, then unpacks it. Lets the YUV capture path run on Linux with a webcam or video file
+        y_size, c_size, chroma_shape = self.y_size, self.c_size, self.chroma_shape
+
+        ycrcb = cv2.cvtColor(bgr_img, cv2.COLOR_BGR2YCrCb, dst=dst)
+        self.raw[:y_size].reshape(self.height, self.width)[:] = ycrcb[..., 0]
+        for channel, offset in ((2, y_size), (1, y_size + c_size)): # U (Cb) then V (Cr)
+            self.raw[offset:offset + c_size].reshape(chroma_shape)[:] = \
+                cv2.resize(ycrcb[..., channel], chroma_shape[::-1], interpolation=cv2.INTER_AREA)
+        return self.unpack(self.raw, dst)
+
+
+
 # Asynchronous camera / video-stream class
 class VideoStream():
 
-    def __init__(self, video_path=None, downsample_scale=1):
+    def __init__(self, video_path=None, downsample_scale=1, read_mode=ReadModes.Latest, ring_size=8,
+            cache_bytes=64 * 1024 * 1024, capture_colorspace=ColorSpaces.BGR):
         self.on_disk = False
         self.piCam = None
-        if video_path:
+        self.store = None
+
+        # capture_colorspace <ColorSpaces>
+        # colorspace frames are produced in. YCrCb keeps the Pi camera's native YUV output rather
+        # than have its firmware convert every frame to BGR, which is then only built if something
+        # (eg. labelling or recording) asks for it. Webcams and videos are converted through I420
+        # to imitate the camera
+        if capture_colorspace not in (ColorSpaces.BGR, ColorSpaces.YCrCb):
+            raise Exception("frames can only be captured in BGR or YCrCb, not %s" % capture_colorspace.name)
+        self.capture_colorspace = capture_colorspace
+        self.unpacker = None
+
+        # frame_pool <FramePool>
+        # recycles the colorspace conversions of this stream's frames once they are released
+        self.frame_pool = FramePool()
+
+        if video_path and FrameStore.is_frame_store(video_path):
+            # store <FrameStore?>
+            # frames already decoded and downsampled by FrameStore.convert(), so downsample_scale
+            # is ignored and no caching is needed
+            self.frame_idx = 0
+            self.store = FrameStore(video_path)
+            self.cap = None
+            self.on_disk = True
+            self.resolution = self.store.resolution
+        elif video_path:
             self.frame_idx = 0
             self.cap = cv2.VideoCapture(video_path)
             self.on_disk = True
@@ -27,8 +217,26 @@ class VideoStream():
                 int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH) / downsample_scale),
                 int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT) / downsample_scale),
             )
+
+            # index of the frame the next cap.read() will decode
+            self.next_decode_idx = 0
+
+            # frame_cache <OrderedDict<key=int, val=np.array<uint8>>>
+            # least-recently-used cache of decoded (and downsampled) frames, shared by iteration
+            # and read_frame(), holding at most cache_bytes of images. 0 disables it
+            self.frame_cache = OrderedDict()
+            self.cache_bytes = cache_bytes
+            self.cached_bytes = 0
         else:
-            if PICAMERA_MODE:
+            simulated_camera = Hardware.camera((
+                int(PI_CAM_RESOLUTION[0] / downsample_scale),
+                int(PI_CAM_RESOLUTION[1] / downsample_scale)
+            ))
+            if simulated_camera is not None:
+                # when the camera is simulated (see Hardware), frames are delivered as the Pi camera would
+                self.cap = simulated_camera
+                self.resolution = simulated_camera.resolution
+            elif PICAMERA_MODE:
                 self.resolution = PiResolution(
                     int(PI_CAM_RESOLUTION[0] / downsample_scale),
                     int(PI_CAM_RESOLUTION[1] / downsample_scale),
@@ -42,10 +250,20 @@ class VideoStream():
                 )
                 self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[1])
                 self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[0])
-                
-            self.imageBuffer = None
-            self.new_frame_lock = Lock()
-            self.writing_frame_lock = Lock()
+
+            # read_mode <ReadModes>
+            # whether reads skip to the newest frame, or see every frame in order
+            self.read_mode = read_mode
+
+            # ring <FrameRing>
+            # ring_size should cover every frame the consumer holds at once (eg. one per
+            # pipeline stage and queue slot) plus two for the capture thread
+            width, height = self.resolution
+            self.ring = FrameRing(ring_size, (height, width, 3))
+
+            if capture_colorspace is ColorSpaces.YCrCb:
+                self.unpacker = I420Unpacker(width, height)
+            self.capture_thread = None
             self.started = False
             self.stopped = False
 
@@ -56,70 +274,148 @@ class VideoStream():
 
 
     def __next__(self):
+        # the time spent waiting here for the next frame is instrumented as "capture_wait"
+        start = Instrumentation.start()
         if self.on_disk:
-            image = self.read_frame(self.frame_idx)
+            try:
+                image = self.read_frame(self.frame_idx)
+            except IndexError:
+                raise StopIteration
             self.frame_idx += 1
+            Instrumentation.stop("capture_wait", start)
             return image
         else:
             if not self.started:
                 self.start()
-            self.new_frame_lock.acquire() # blocks until there is a new frame
-            image = self.imageBuffer
-            if self.piCam:
-                image = image.reshape(self.resolution.transpose() + (3,))
 
-        if image.shape != self.resolution + (3,):
-            image = cv2.resize(image, self.resolution)
-
-        return Frame(image)
+            idx, seq = self.ring.read(self.read_mode is ReadModes.Sequential)
+            Instrumentation.stop("capture_wait", start)
+            frame = Frame(
+                self.ring.buffers[idx],
+                on_release=partial(self.ring.release, idx),
+                pool=self.frame_pool,
+                colorspace=self.capture_colorspace
+            )
+            frame.seq = seq
+            frame.timestamp = self.ring.stamps[idx]
+            return frame
 
 
     def update(self):
-        image = None
-        while True:
-            if self.piCam:
-                self.imageBuffer = image
-                image = np.empty((self.resolution[0] * self.resolution[1] * 3,), dtype=np.uint8)
-                self.piCam.capture(image, 'bgr', use_video_port=True)
-                try: # hacks
-                    self.new_frame_lock.release()
-                except RuntimeError:
-                    pass
+        sequential = self.read_mode is ReadModes.Sequential
+        capture_buffer = None
 
-                if self.stopped:
-                    return
+        while not self.stopped:
+            idx = self.ring.acquire_write(sequential)
+            if idx is None:
+                return
+            image = self.ring.buffers[idx]
+
+            if self.piCam and self.unpacker:
+                self.piCam.capture(self.unpacker.raw, 'yuv', use_video_port=True)
+                self.unpacker.unpack(self.unpacker.raw, image)
+            elif self.piCam:
+                # the camera writes the padded resolution straight into the buffer
+                self.piCam.capture(image.reshape(-1), 'bgr', use_video_port=True)
             else:
-                _, self.imageBuffer = self.cap.read()
-                try: #hacks
-                    self.new_frame_lock.release()
-                except RuntimeError:
-                    pass
-                
-                if self.stopped:
-                    return
+                ok, capture_buffer = self.cap.read(capture_buffer)
+                if not ok:
+                    continue
+                if self.unpacker:
+                    if capture_buffer.shape[1::-1] != tuple(self.resolution):
+                        capture_buffer = cv2.resize(capture_buffer, tuple(self.resolution))
+                    self.unpacker.from_bgr(capture_buffer, image)
+                elif capture_buffer.shape == image.shape:
+                    np.copyto(image, capture_buffer)
+                else:
+                    cv2.resize(capture_buffer, tuple(self.resolution), dst=image)
+
+            self.ring.publish(idx, perf_counter())
 
 
     def close(self):
         self.stopped = True
+        if not self.on_disk:
+            self.ring.stop()
+            if self.capture_thread is not None:
+                self.capture_thread.join()
+
         if self.piCam:
             self.piCam.close()
-        else:
+        elif self.cap is not None:
             self.cap.release()
-            
+
 
     def read_frame(self, frame_idx):
         if not self.on_disk:
             raise Exception("Reading specific frames is not possible in a live feed... unless another feature is added")
 
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-        _, bgr_img = self.cap.read()
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-        if bgr_img.shape != self.resolution + (3,):
-            bgr_img = cv2.resize(bgr_img, self.resolution)
-        return Frame(bgr_img)
-
-    
-    def start(self):
-        self.new_frame_lock.acquire()
-        Thread(target=self.update).start()
-        self.started = True
\ No newline at end of file
+        if self.store is not None:
+            return self.store.read_frame(frame_idx)
+
+        if frame_idx in self.frame_cache:
+            self.frame_cache.move_to_end(frame_idx)
+            bgr_img = self.frame_cache[frame_idx]
+        else:
+            bgr_img = self.decode_frame(frame_idx)
+            if self.cache_bytes > 0:
+                self.frame_cache[frame_idx] = bgr_img
+                self.cached_bytes += bgr_img.nbytes
+                while self.cached_bytes > self.cache_bytes:
+                    _, evicted = self.frame_cache.popitem(last=False)
+                    self.cached_bytes -= evicted.nbytes
+
+        if self.capture_colorspace is ColorSpaces.YCrCb:
+            if self.unpacker is None:
+                self.unpacker = I420Unpacker(*self.resolution)
+            height, width = bgr_img.shape[:2]
+            frame = Frame(
+                self.unpacker.from_bgr(bgr_img, np.empty((height, width, 3), dtype=np.uint8)),
+                pool=self.frame_pool,
+                colorspace=ColorSpaces.YCrCb
+            )
+        else:
+            # consumers draw on frames in place, so never hand out the cached image itself
+            frame = Frame(np.copy(bgr_img) if self.cache_bytes > 0 else bgr_img, pool=self.frame_pool)
+        frame.seq = frame_idx
+        return frame
+
+
+    def frame_count(self):
+        if self.store is not None:
+            return self.store.frame_count
+        return int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+
+    def fps(self):
+        if self.store is not None:
+            return self.store.fps
+        return self.cap.get(cv2.CAP_PROP_FPS)
+
+
+    def decode_frame(self, frame_idx):
+        # only seek when the frame asked for isn't the next one in the file, as every seek
+        # decodes forward from the nearest keyframe
+        if frame_idx != self.next_decode_idx:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+
+        ok, bgr_img = self.cap.read()
+        if not ok:
+            self.next_decode_idx = -1 # unknown position, so seek next time
+            raise IndexError("frame %d could not be read from the video" % frame_idx)
+        self.next_decode_idx = frame_idx + 1
+
+        if bgr_img.shape[1::-1] != tuple(self.resolution):
+            bgr_img = cv2.resize(bgr_img, tuple(self.resolution))
+        return bgr_img
+
+
+    def start(self, wait=False, timeout=None):
+        # capture starts on the first read unless started beforehand
+        # wait <bool>: whether to block until the camera has delivered its first frame (at most
+        #     timeout seconds), returning whether it did
+        if not self.started:
+            self.capture_thread = Thread(target=self.update, daemon=True)
+            self.capture_thread.start()
+            self.started = True
+        return self.ring.wait_for_frame(timeout) if wait else True
@@ -1,9 +1,31 @@
 import cv2
 import numpy as np
 import math
-from .DetectionModel.ThreshBlob import ThreshBlob
-from .DetectionModel import ColorSpaces
+from copy import copy
+from .DetectionModel.ThreshBlob import ThreshBlob, ColorLUT
+from .DetectionModel import ColorSpaces, artefact_cache
 from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from enum import Enum
+from time import perf_counter
+import Instrumentation
+
+
+
+class ExecutionModes(Enum):
+
+    # every object is detected one after the other on the calling thread
+    Serial = 1
+
+    # objects are detected concurrently on a persistent thread pool. OpenCV releases the GIL
+    # while it works, so this uses multiple cores without copying any frames
+    Threads = 2
+
+    # objects are detected concurrently on a persistent process pool. Each worker holds its own
+    # copy of the objects taken when the pool starts, so later changes to their models (eg. from
+    # the tuner) are not seen by the workers. Frames and results are pickled across each frame
+    Processes = 3
+
 
 
 class VisionSystem():
@@ -21,7 +43,12 @@ class VisionSystem():
     ]
 
 
-    def __init__(self, objects_to_track, camera_pixel_width):
+    # the fused label image is uint8, so it can hold at most this many objects' bits
+    MAX_FUSED_OBJECTS = 8
+
+
+    def __init__(self, objects_to_track, camera_pixel_width, fused=False, lut_bits=None,
+            execution_mode=ExecutionModes.Serial, workers=None, scheduler=None):
         # objects_to_track <dict<key=str, val=VisualObject>>
         # the objects that the vision system should attempt to track every time
         # update_with_frame() is called
@@ -29,11 +56,191 @@ class VisionSystem():
 
         for _, obj in self.objects_to_track.items():
             obj.camera_pixel_width = camera_pixel_width
+
+        # fused <bool>
+        # whether to threshold every thresholder-based object in a single pass over the frame.
+        # all of their thresholds are compiled into one lookup table whose entries hold one bit
+        # per object, so each frame is read once to make a label image, and each object's
+        # blob stage then reads its own bit plane of that image
+        self.fused = fused
+
+        # lut_bits <tuple<int, int, int>>
+        # per-channel quantization of the fused lookup table, see ColorLUT
+        self.lut_bits = tuple(lut_bits or (6, 6, 6))
+
+        # label_image <np.array<uint8>?>
+        # the most recent fused label image, bit i set where fused object i's threshold accepts.
+        # Made at each scale the fused objects are detected at, keyed by scale in label_images
+        self.label_image = None
+        self.label_images = {}
+
+        self.fused_lut = None
+        self.fused_lut_key = None
+
+        # execution_mode <ExecutionModes>
+        # how detection is spread over the tracked objects
+        self.execution_mode = execution_mode
+
+        # workers <int?>
+        # size of the worker pool. Defaults to one worker per core
+        self.workers = workers
+        self.pool = None
+
+        # object_timings <dict<key=str, val=float>>
+        # seconds spent detecting each object in the last update_with_frame() call,
+        # measured on whichever worker ran it
+        self.object_timings = {}
+
+        # scheduler <DetectionScheduler?>
+        # picks which objects are detected on each frame. Every object is detected on every
+        # frame without one
+        self.scheduler = scheduler
         
 
     def update_with_frame(self, frame):
-        for _, obj in self.objects_to_track.items():
-            obj.update_with_frame(frame)
+        names = list(self.objects_to_track.keys())
+        if self.scheduler is not None:
+            names = self.scheduler.due(names, frame.timestamp)
+        masks = self.fused_masks(frame, names) if self.fused and names else {}
+
+        if self.execution_mode is ExecutionModes.Serial:
+            timings = [update_obj(self.objects_to_track[name], frame, masks.get(name)) for name in names]
+
+        elif self.execution_mode is ExecutionModes.Threads:
+            timings = self.get_pool().map(
+                lambda name: update_obj(self.objects_to_track[name], frame, masks.get(name)),
+                names
+            )
+
+        elif self.execution_mode is ExecutionModes.Processes:
+            # starmap() gathers the results in the same order as names
+            # tracking state goes back and forth with each task, as any worker may get the next one
+            results = self.get_pool().starmap(detect_obj_in_worker, [
+                (name, frame, masks.get(name), self.objects_to_track[name].track_state()) for name in names
+            ])
+            timings = []
+            for name, (detection_results, bearings_distances, track_state, elapsed) in zip(names, results):
+                obj = self.objects_to_track[name]
+                obj.detection_results = detection_results
+                obj.bearings_distances = bearings_distances
+                obj.updated_at = frame.timestamp
+                obj.set_track_state(track_state)
+                timings.append(elapsed)
+
+        else:
+            raise Exception("unknown execution mode " + str(self.execution_mode))
+
+        self.object_timings = dict(zip(names, timings))
+
+
+    def set_priorities(self, priorities):
+        # priorities <dict<key=str, val=float>>
+        # hook for navigation to say how much each object matters in its current state,
+        # see DetectionScheduler. Does nothing without a scheduler
+        if self.scheduler is not None:
+            self.scheduler.set_priorities(priorities)
+
+
+    def get_pool(self):
+        # pools are started on first use and kept for the life of the vision system
+        if self.pool is None:
+            if self.execution_mode is ExecutionModes.Threads:
+                self.pool = ThreadPool(self.workers)
+            else:
+                self.pool = Pool(self.workers, initializer=init_worker, initargs=(self.objects_to_track,))
+        return self.pool
+
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+    def fused_objects(self):
+        # the objects whose detection models threshold with a Thresholder, in a fixed order
+        return [
+            (name, obj) for name, obj in self.objects_to_track.items()
+            if hasattr(obj.detection_model, 'thresholder')
+        ]
+
+
+    @Instrumentation.instrumented("threshold")
+    def fused_masks(self, frame, names=None):
+        # names: the objects to make masks for, defaults to all of them. The label image is always
+        # made for every fused object, so that the lookup table doesn't change with the names
+        fused_objects = self.fused_objects()
+        self.compile_fused_lut(frame.source)
+
+        # one label image per scale the objects are detected at, each made from that level of the
+        # frame's pyramid and shared by every object at that scale
+        self.label_images = {}
+        masks = {}
+        for bit, (name, obj) in enumerate(fused_objects):
+            if names is not None and name not in names:
+                continue
+            if obj.scale not in self.label_images:
+                level = frame.scaled(obj.scale)
+                self.label_images[obj.scale] = self.fused_lut.apply(level.get(level.source))
+            masks[name] = cv2.threshold(
+                np.bitwise_and(self.label_images[obj.scale], 1 << bit), 0, 255, cv2.THRESH_BINARY
+            )[1]
+
+        self.label_image = self.label_images.get(1)
+        return masks
+
+
+    def compile_fused_lut(self, source):
+        # recompile only when one of the thresholds has changed (eg. from the tuner)
+        # the table is indexed by the frame's capture colorspace, so no frame is ever converted
+        fused_objects = self.fused_objects()
+        if len(fused_objects) > self.MAX_FUSED_OBJECTS:
+            raise Exception("fused mode supports at most %d thresholded objects" % self.MAX_FUSED_OBJECTS)
+
+        thresholders = [obj.detection_model.thresholder for _, obj in fused_objects]
+        key = tuple(thresholder.lut_key() for thresholder in thresholders) + (self.lut_bits, source.name)
+        if self.fused_lut is None or self.fused_lut_key != key:
+            self.fused_lut = ColorLUT(self.lut_bits, source).compile(
+                thresholders,
+                values=[1 << bit for bit in range(len(thresholders))],
+                cache=artefact_cache()
+            )
+            self.fused_lut_key = key
+        return self.fused_lut
+
+
+    def prepare(self, source=ColorSpaces.BGR):
+        # builds everything the models would otherwise build on first use, for frames captured
+        # in source
+        for obj in self.objects_to_track.values():
+            obj.detection_model.prepare(source)
+        if self.fused:
+            self.compile_fused_lut(source)
+
+
+    def reset(self):
+        # forgets every object's detections and tracking (but not what prepare() built), eg.
+        # after warming up on dummy frames
+        for obj in self.objects_to_track.values():
+            obj.reset()
+        if self.scheduler is not None:
+            self.scheduler.reset()
+        self.label_image = None
+        self.label_images = {}
+        self.object_timings = {}
+
+
+    def snapshot(self):
+        # snapshot <dict<key=str, val=tuple<[DetectionResult], [tuple<float, float>], AlphaBetaFilter?, float?>>>
+        # each object's current detection results, bearings / distances, a copy of its estimator
+        # and the timestamp of the frame the results are from. Objects replace these lists on
+        # every update rather than mutating them, so a snapshot stays consistent while later
+        # frames are processed (eg. by another pipeline stage)
+        return {
+            name: (obj.detection_results, obj.bearings_distances, copy(obj.estimator), obj.updated_at)
+            for name, obj in self.objects_to_track.items()
+        }
 
 
     def update_with_and_label_frame(self, frame):
@@ -41,23 +248,58 @@ class VisionSystem():
         return self.label_frame(frame)
 
         
-    def label_frame(self, frame):
+    def label_frame(self, frame, snapshot=None):
+        # snapshot: results to draw, as returned by snapshot(). Defaults to the current results
+        snapshot = snapshot or self.snapshot()
         img = frame.get()
-        for obj_idx, (name, obj_type) in enumerate(self.objects_to_track.items()):
-            for res_idx, (result, (bearing, distance)) in enumerate(zip(obj_type.detection_results, obj_type.bearings_distances)):
-                draw_color = VisionSystem.CATEGORICAL_COLORS[obj_idx]
-                img = cv2.rectangle(img, result.coords[0], result.coords[1], draw_color)
-
-                img = cv2.putText(
-                    img,
-                    text="%s%d: %.2fcm@%.0fdeg" % (name, res_idx, distance * 100, math.degrees(bearing)),
-                    org=(result.coords[0][0], result.coords[0][1] - 10),
-                    fontFace=cv2.FONT_HERSHEY_PLAIN,
-                    fontScale=1,
-                    color=draw_color
-                )
+        for obj_idx, name in enumerate(self.objects_to_track.keys()):
+            detection_results, bearings_distances = snapshot[name][:2]
+            img = VisionSystem.draw_detections(
+                img, obj_idx, name, [result.coords for result in detection_results], bearings_distances
+            )
         return img
 
 
-def update_obj(obj, frame):
-    obj.update_with_frame(frame)
\ No newline at end of file
+    @staticmethod
+    def draw_detections(img, obj_idx, name, coords, bearings_distances):
+        # draws an object's results onto img in its colour, which is picked by its index in
+        # objects_to_track. Also used to label recordings offline (see LabelRenderer)
+        # coords <[tuple<tuple<int, int>, tuple<int, int>>]>: each result's corners
+        draw_color = VisionSystem.CATEGORICAL_COLORS[obj_idx]
+        for res_idx, (result_coords, (bearing, distance)) in enumerate(zip(coords, bearings_distances)):
+            (x1, y1), (x2, y2) = result_coords
+            img = cv2.rectangle(img, (int(x1), int(y1)), (int(x2), int(y2)), draw_color)
+
+            img = cv2.putText(
+                img,
+                text="%s%d: %.2fcm@%.0fdeg" % (name, res_idx, distance * 100, math.degrees(bearing)),
+                org=(int(x1), int(y1) - 10),
+                fontFace=cv2.FONT_HERSHEY_PLAIN,
+                fontScale=1,
+                color=draw_color
+            )
+        return img
+
+
+def update_obj(obj, frame, mask=None):
+    start = perf_counter()
+    obj.update_with_frame(frame, mask=mask)
+    return perf_counter() - start
+
+
+
+# the process pool's copy of the tracked objects, set once per worker by init_worker()
+worker_objects = None
+
+
+def init_worker(objects_to_track):
+    global worker_objects
+    worker_objects = objects_to_track
+
+
+def detect_obj_in_worker(name, frame, mask=None, track_state=None):
+    obj = worker_objects[name]
+    if track_state is not None:
+        obj.set_track_state(track_state)
+    elapsed = update_obj(obj, frame, mask)
+    return obj.detection_results, obj.bearings_distances, obj.track_state(), elapsed
\ No newline at end of file
@@ -1,5 +1,9 @@
 import math
-from .DetectionModel import DetectionResult
+import cv2
+from time import perf_counter
+from .DetectionModel import DetectionResult, Frame
+from .AlphaBetaFilter import AlphaBetaFilter
+import Instrumentation
 
 
 class VisualObject():
@@ -10,7 +14,25 @@ class VisualObject():
     FOCAL_CONSTANT = 250
 
     
-    def __init__(self, real_size=None,  detection_model=None, result_limit=None, camera_width=None):
+    # class-level defaults so that objects pickled before these options existed still load
+    search_region = None
+    tracking = False
+    track_padding = 1.0
+    track_min_padding = 8
+    reacquire_interval = 30
+    track_box = None
+    track_velocity = (0, 0)
+    track_seq = None
+    frames_since_full_search = 0
+    tracking_stats = None
+    estimator = None
+    updated_at = None
+    scale = 1
+    track_scale = None
+
+    
+    def __init__(self, real_size=None,  detection_model=None, result_limit=None, camera_width=None, search_region=None,
+            tracking=False, track_padding=1.0, track_min_padding=8, reacquire_interval=30, estimator=True, scale=1):
         self.camera_pixel_width = camera_width
 
         # real_size <tupe<float, float, float>>
@@ -34,12 +56,85 @@ class VisualObject():
 
         self.result_limit = result_limit
 
+        # search_region <SearchRegion?>
+        # the part of the frame this object can appear in. Detection only runs on the smallest
+        # crop covering it, rather than on the whole frame
+        self.search_region = search_region
+
+        # tracking <bool>
+        # whether to search a window around where the object is predicted to be from its last
+        # detections, rather than the whole search region. The whole region is still searched
+        # when there is nothing to track, when the window search fails, and every
+        # reacquire_interval frames so that new detections elsewhere are not missed for long
+        self.tracking = tracking
+
+        # track_padding <float>, track_min_padding <int>
+        # how far the window extends past the predicted bounding box on each side, as a
+        # fraction of the box's size, and at least this many pixels
+        self.track_padding = track_padding
+        self.track_min_padding = track_min_padding
+        self.reacquire_interval = reacquire_interval
+
+        # track_box <tuple<int, int, int, int>?>
+        # (x1, y1, x2, y2) bounds of the last detections in pixels at the object's scale,
+        # None if there were none
+        self.track_box = None
+
+        # track_velocity <tuple<float, float>>
+        # pixels per frame the track box moved between its last two detections
+        self.track_velocity = (0, 0)
+        self.track_seq = None
+        self.frames_since_full_search = 0
+
+        # tracking_stats <dict<key=str, val=int>>
+        # hits: window searches that found the object
+        # misses: window searches that found nothing
+        # fallbacks: window searches followed by a full search, after a miss or a result cut by
+        #     the window's edge
+        # reacquires: full searches because reacquire_interval frames had passed
+        # untracked: full searches because there was nothing to track
+        self.tracking_stats = new_tracking_stats()
+
+        # estimator <AlphaBetaFilter?>
+        # filters the most likely detection's bearing and distance over time, so that where the
+        # object is can be estimated at any time (see estimate()). True for a default filter
+        self.estimator = AlphaBetaFilter() if estimator is True else (estimator or None)
+
+        # updated_at <float?>
+        # timestamp of the frame the current results were detected on. Results are carried
+        # forward on frames where the object isn't detected (see DetectionScheduler)
+        self.updated_at = None
+
+        # scale <float>
+        # factor the frame is shrunk by before this object is detected in it (eg. 2 for half the
+        # width and height), so large objects needn't pay for the pixels small ones need. Results
+        # are mapped back into the full frame's pixels. The model's area limits are in pixels at
+        # this scale
+        self.scale = scale
+
         
-    def update_with_frame(self, frame):
-        self.detection_results = self.detection_model.apply(frame)
+    def update_with_frame(self, frame, mask=None):
+        # mask <np.array<uint8>?>
+        # pre-thresholded mask for this object at its scale, as produced by the VisionSystem's
+        # fused mode
+        level = scaled_level(frame, self.scale)
+
+        if self.tracking:
+            self.detection_results = self.track(level, mask)
+        else:
+            self.detection_results = self.detect(level, mask)
         self.detection_results = sorted(self.detection_results, key=lambda result: -result.area())
         if self.result_limit is not None:
             self.detection_results = self.detection_results[0:self.result_limit]
+        if self.tracking:
+            self.update_track(level)
+
+        start = Instrumentation.start()
+        if level is not frame:
+            (height, width), (level_height, level_width) = frame_shape(frame), frame_shape(level)
+            for result in self.detection_results:
+                result.rescale(width / level_width, height / level_height)
+
         self.bearings_distances = []
 
         for result in self.detection_results:
@@ -58,5 +153,215 @@ class VisualObject():
             )
 
             self.bearings_distances.append((bearing, distance))
+        Instrumentation.stop("geometry", start)
+
+        self.updated_at = frame.timestamp if type(frame) is Frame else perf_counter()
+        if self.estimator is not None and self.bearings_distances:
+            self.estimator.update(self.bearings_distances[0], self.updated_at)
         
-        return self.detection_results
\ No newline at end of file
+        return self.detection_results
+
+
+    def reset(self):
+        # forgets every detection, and everything tracking and estimation learnt from them
+        self.detection_results = []
+        self.bearings_distances = []
+        self.updated_at = None
+        self.track_box = None
+        self.track_velocity = (0, 0)
+        self.track_seq = None
+        self.track_scale = None
+        self.frames_since_full_search = 0
+        self.tracking_stats = new_tracking_stats()
+        if self.estimator is not None:
+            self.estimator.clear()
+
+
+    def staleness(self, timestamp=None):
+        # seconds since the current results were detected, None if they never have been
+        if self.updated_at is None:
+            return None
+        return (perf_counter() if timestamp is None else timestamp) - self.updated_at
+
+
+    def estimate(self, timestamp=None):
+        # (bearing, distance) of the object at timestamp (perf_counter() seconds, defaulting to
+        # now) as predicted from its recent detections, or None if it hasn't been seen lately.
+        # Falls back to the last detection when there is no estimator
+        if self.estimator is None:
+            return self.bearings_distances[0] if self.bearings_distances else None
+        return self.estimator.estimate(timestamp)
+
+
+    def detect(self, frame, mask=None, window=None):
+        # window <tuple<int, int, int, int>?>
+        # (x1, y1, x2, y2) pixel bounds to search within, on top of the search region
+        region = self.search_region
+        if window is None and (region is None or region.is_full_frame()):
+            return self.detection_model.apply(frame, mask=mask, limit=self.result_limit)
+
+        height, width = frame_shape(frame)
+        x1, y1, x2, y2 = self.search_bounds(width, height, window)
+        if x2 <= x1 or y2 <= y1:
+            return []
+
+        if type(frame) is Frame:
+            cropped = frame.crop(x1, y1, x2, y2)
+        else:
+            cropped = frame[y1:y2, x1:x2]
+
+        # a polygon can still reject results after detection, so the limit can't stop it early
+        limit = self.result_limit if region is None or region.polygon is None else None
+        results = self.detection_model.apply(
+            cropped,
+            mask=None if mask is None else mask[y1:y2, x1:x2],
+            limit=limit
+        )
+
+        if type(cropped) is Frame:
+            cropped.release()
+
+        results = [result.translate(x1, y1) for result in results]
+        if region is not None:
+            results = [result for result in results if region.contains(result.center(), width, height)]
+        return results
+
+
+    def search_bounds(self, width, height, window=None):
+        x1, y1, x2, y2 = self.search_region.bounds(width, height) if self.search_region else (0, 0, width, height)
+        if window is not None:
+            x1, y1 = max(x1, window[0]), max(y1, window[1])
+            x2, y2 = min(x2, window[2]), min(y2, window[3])
+        return x1, y1, x2, y2
+
+
+    def track(self, frame, mask=None):
+        if self.tracking_stats is None:
+            self.tracking_stats = new_tracking_stats()
+
+        height, width = frame_shape(frame)
+        window = self.tracking_window(frame, width, height)
+
+        if window is None:
+            self.tracking_stats["untracked" if self.track_box is None else "reacquires"] += 1
+            self.frames_since_full_search = 0
+            return self.detect(frame, mask)
+
+        results = self.detect(frame, mask, window)
+
+        # a result touching an edge of the window that isn't an edge of the search region may
+        # have been cut off by the window, so is only trusted from a full search. Far corners are
+        # exclusive for every blob engine (see DetectionResult.coords), so a result running
+        # through the window's right or bottom edge ends exactly on it
+        inner = self.search_bounds(width, height, window)
+        outer = self.search_bounds(width, height)
+        cut = any(
+            (inner[0] > outer[0] and x1 <= inner[0]) or
+            (inner[1] > outer[1] and y1 <= inner[1]) or
+            (inner[2] < outer[2] and x2 >= inner[2]) or
+            (inner[3] < outer[3] and y2 >= inner[3])
+            for ((x1, y1), (x2, y2)) in [result.coords for result in results]
+        )
+
+        if results and not cut:
+            self.tracking_stats["hits"] += 1
+            self.frames_since_full_search += 1
+            return results
+
+        if not results:
+            self.tracking_stats["misses"] += 1
+        self.tracking_stats["fallbacks"] += 1
+        self.frames_since_full_search = 0
+        return self.detect(frame, mask)
+
+
+    def tracking_window(self, frame, width, height):
+        # (x1, y1, x2, y2) window around where the object should be in this frame, or None when
+        # the whole search region should be searched instead
+        if self.track_box is None or self.frames_since_full_search >= self.reacquire_interval or \
+                self.track_scale != self.scale:
+            return None
+
+        # predict with constant velocity from the last two detections
+        frames = frame_steps(self.track_seq, frame)
+        dx, dy = self.track_velocity[0] * frames, self.track_velocity[1] * frames
+
+        x1, y1, x2, y2 = self.track_box
+        pad_x = max(self.track_min_padding, (x2 - x1) * self.track_padding)
+        pad_y = max(self.track_min_padding, (y2 - y1) * self.track_padding)
+        return (
+            max(0, int(x1 + dx - pad_x)),
+            max(0, int(y1 + dy - pad_y)),
+            min(width, int(math.ceil(x2 + dx + pad_x))),
+            min(height, int(math.ceil(y2 + dy + pad_y)))
+        )
+
+
+    def update_track(self, frame):
+        seq = frame.seq if type(frame) is Frame else None
+        if not self.detection_results:
+            self.track_box = None
+            self.track_velocity = (0, 0)
+            self.track_seq = seq
+            return
+
+        box = (
+            min(result.coords[0][0] for result in self.detection_results),
+            min(result.coords[0][1] for result in self.detection_results),
+            max(result.coords[1][0] for result in self.detection_results),
+            max(result.coords[1][1] for result in self.detection_results)
+        )
+
+        if self.track_box is not None:
+            frames = frame_steps(self.track_seq, frame)
+            self.track_velocity = (
+                ((box[0] + box[2]) - (self.track_box[0] + self.track_box[2])) / 2 / frames,
+                ((box[1] + box[3]) - (self.track_box[1] + self.track_box[3])) / 2 / frames
+            )
+        else:
+            self.track_velocity = (0, 0)
+
+        self.track_box = box
+        self.track_seq = seq
+        self.track_scale = self.scale
+
+
+    def track_state(self):
+        # everything tracking and estimation carry from one frame to the next, so that they can
+        # follow the object across copies of it (eg. in the VisionSystem's worker processes)
+        return (self.track_box, self.track_velocity, self.track_seq, self.track_scale, self.frames_since_full_search,
+            self.tracking_stats, self.estimator)
+
+
+    def set_track_state(self, state):
+        self.track_box, self.track_velocity, self.track_seq, self.track_scale, self.frames_since_full_search, \
+            self.tracking_stats, self.estimator = state
+
+
+
+def scaled_level(frame, scale):
+    # a Frame or an image shrunk by a factor of scale, see Frame.scaled()
+    if scale == 1:
+        return frame
+    if type(frame) is Frame:
+        return frame.scaled(scale)
+    height, width = frame.shape[:2]
+    size = (max(1, int(round(width / scale))), max(1, int(round(height / scale))))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+def frame_shape(frame):
+    # (height, width) of a Frame or an image
+    return frame.shape() if type(frame) is Frame else frame.shape[:2]
+
+
+def frame_steps(last_seq, frame):
+    # frames since the one numbered last_seq, assuming 1 when the frames aren't numbered
+    seq = frame.seq if type(frame) is Frame else None
+    if seq is None or last_seq is None or seq <= last_seq:
+        return 1
+    return seq - last_seq
+
+
+def new_tracking_stats():
+    return {"hits": 0, "misses": 0, "fallbacks": 0, "reacquires": 0, "untracked": 0}
\ No newline at end of file
@@ -1,5 +1,10 @@
 # re-exports
-from .VisionSystem import VisionSystem
+from .VisionSystem import VisionSystem, ExecutionModes
 from .VisualObject import VisualObject
+from .SearchRegion import SearchRegion
+from .AlphaBetaFilter import AlphaBetaFilter
+from .DetectionScheduler import DetectionScheduler
 from .DetectionModel import DetectionModel
-from .VideoStream import VideoStream
\ No newline at end of file
+from .VideoStream import VideoStream, ReadModes
+from .FrameStore import FrameStore
+from .VideoRecorder import VideoRecorder
\ No newline at end of file
@@ -1,27 +1,66 @@
 # global imports
+from time import time, perf_counter
+started_at = perf_counter() # importing is the first phase of start-up, see startup_phases
 import os
 import cv2
-from time import time
+import signal
+import numpy as np
+from contextlib import contextmanager
 from tqdm import tqdm
-import RPi.GPIO
 
 # subsystem imports
-from VisionSystem import VisionSystem, VisualObject, VideoStream
-from VisionSystem.DetectionModel import ThreshBlob
+from VisionSystem import VisionSystem, VisualObject, VideoStream, VideoRecorder, SearchRegion, DetectionScheduler
+from VisionSystem.DetectionModel import ThreshBlob, ColorSpaces, Frame
 from DriveSystem import DriveSystem
 from KickerSystem import KickerSystem
-from NavigationSystem import NavigationSystem
+from NavigationSystem import NavigationSystem, NavStates
+from Pipeline import Pipeline, Stage, QueuePolicies
+from Telemetry import TelemetryLog
+from Hardware import GPIO, SimulatedCamera
+import Hardware
+import Instrumentation
 
 
+# Run capture, detection, navigation and recording as overlapping pipeline stages
+# rather than one after the other
+PIPELINED = True
+
+# Colorspace the camera captures in. YCrCb keeps the camera's native output, and is only worth
+# it when the models are compiled (or tuned in YCrCb), as they can then threshold it directly
+CAPTURE_COLORSPACE = ColorSpaces.BGR
+
+# Frames of a synthetic scene run through detection and navigation, with the drive and kicker
+# disarmed, before the camera starts. This gets first-use work (OpenCV initialisation, lookup
+# tables, frame buffers, worker pools) out of the way before the match rather than in its opening
+# seconds. 0 skips warming up
+WARM_UP_FRAMES = 10
+
+# seconds to wait for the camera's first frame before starting the loop regardless
+CAMERA_START_TIMEOUT = 5
+
+# Log what was seen and done on every frame to debug_data/telemetry*.tlog (see TelemetryLog),
+# which costs far less than recording video, so can be left on for matches
+TELEMETRY = True
+
 # Debug variables
 DEBUG_MODE = True
 SHOW_LIVE = False # only works in DEBUG_MODE
-raw_debug_writer = None
-labelled_debug_writer = None
+
+# Label the debug video on the robot. Otherwise only the raw video is recorded, and is labelled
+# afterwards from the telemetry with python -m Telemetry (so this is forced on without TELEMETRY)
+LABEL_LIVE = False
 progress_bar = None
 
+# startup_phases <[tuple<str, float>]>
+# name and duration in seconds of each phase of start-up, see startup_phase()
+startup_phases = [("imports", perf_counter() - started_at)]
+
+# frames waiting to be recorded before the oldest are dropped, so that recording never holds up
+# the control loop
+RECORDER_QUEUE_SIZE = 4
+
 if DEBUG_MODE: # ignore this ^_^
-    RPi.GPIO.setwarnings(False)
+    GPIO.setwarnings(False)
 
 # helper methods
 def relpath(*paths):
@@ -31,23 +70,38 @@ def relpath(*paths):
 # load detection models and setup vision system with all objects' sizes for distance
 # detection
 def setup_vision_system(resolution):
+    # search regions (eg. SearchRegion(rows=(0.4, 1)) for below the horizon) limit each object's
+    # detection to the part of the frame it can appear in. None searches the whole frame
     objects_to_size_and_result_limit = [
-        ("ball", (0.043, 0.043, 0.043), 1),
-        ("obstacle", (0.18, 0.18, 0.2), None),
-        ("blue_goal", (0.3, 0.3, 0.1), 1), # 30 centimetres long, 10 cm high? i guess
-        ("yellow_goal", (0.3, 0.3, 0.1), 1)
+        ("ball", (0.043, 0.043, 0.043), 1, None),
+        ("obstacle", (0.18, 0.18, 0.2), None, None),
+        ("blue_goal", (0.3, 0.3, 0.1), 1, None), # 30 centimetres long, 10 cm high? i guess
+        ("yellow_goal", (0.3, 0.3, 0.1), 1, None)
     ]
 
-    return VisionSystem(camera_pixel_width=resolution[0], objects_to_track={
+    # objects searched for near their last detection rather than over the whole frame
+    tracked_objects = ["ball"]
+
+    # target detections per second of each object, scaled by the navigation state's priorities
+    scheduler = DetectionScheduler(rates={
+        "ball": 30,
+        "obstacle": 15,
+        "blue_goal": 15,
+        "yellow_goal": 15
+    })
+
+    return VisionSystem(camera_pixel_width=resolution[0], scheduler=scheduler, objects_to_track={
         name: VisualObject(
             real_size=size,
-            detection_model=ThreshBlob.load(relpath("detection_models", name + "_model.threshblob.pkl")),
-            result_limit=result_limit
-        ) for name, size, result_limit in objects_to_size_and_result_limit
+            detection_model=ThreshBlob.load(relpath("detection_models", name + "_model.threshblob.json")),
+            result_limit=result_limit,
+            search_region=search_region,
+            tracking=name in tracked_objects
+        ) for name, size, result_limit, search_region in objects_to_size_and_result_limit
     })
 
 
-def setup_debug_tools(resolution):
+def setup_debug_tools(resolution, vision_system, fps_counter):
     index = ''
     filename = lambda: relpath('debug_data', 'profile_vid' + index)
     global progress_bar
@@ -62,65 +116,189 @@ def setup_debug_tools(resolution):
             pass # Go and try create file again
         else:
             break
+    os.makedirs(relpath('debug_data'), exist_ok=True)
+
+    # label image with bounding boxes and fps, on the recorder's thread
+    def label(frame, snapshot):
+        vision_system.label_frame(frame, snapshot)
+        cv2.putText(
+            frame.get(),
+            text="FPS: %d" % fps_counter["last_sec_fps"],
+            org=(15, 15),
+            fontFace=cv2.FONT_HERSHEY_PLAIN,
+            fontScale=1.5,
+            color=(0, 255, 255)
+        )
 
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    raw_debug_writer = cv2.VideoWriter(filename() + "_raw.avi", fourcc, 20.0, resolution)
-    labelled_debug_writer = cv2.VideoWriter(filename() + '_labelled.avi', fourcc, 20.0, resolution)
-    return (raw_debug_writer, labelled_debug_writer, progress_bar)
+    recorder = VideoRecorder(filename(), resolution, fps=20.0, maxsize=RECORDER_QUEUE_SIZE,
+        label=label if LABEL_LIVE or SHOW_LIVE or not TELEMETRY else None, keep_latest=SHOW_LIVE)
+    return (recorder, progress_bar)
 
 
 def cleanup_debug_tools(debug_tools):
     if DEBUG_MODE:
-        (raw_debug_writer, labelled_debug_writer, _) = debug_tools
-        raw_debug_writer.release()
-        labelled_debug_writer.release()
+        (recorder, _) = debug_tools
+        recorder.close()
+        debug_print("recorded %(encoded)d frames, dropped %(dropped)d" % recorder.stats())
         if SHOW_LIVE:
             cv2.destroyAllWindows()
 
 
-def mainloop(vision_system, video_stream, nav_system, drive_system, kicker_system, debug_tools=None):
+def new_fps_counter():
+    return {"frames_this_sec": 0, "last_sec_fps": 0, "last_sec_time": time()}
+
+
+def count_frame(fps_counter):
+    fps_counter["frames_this_sec"] += 1
+    now_time = time()
+    if now_time - fps_counter["last_sec_time"] >= 1:
+        fps_counter["last_sec_time"] = now_time
+        fps_counter["last_sec_fps"] = fps_counter["frames_this_sec"]
+        fps_counter["frames_this_sec"] = 0
+
+
+def show_live(recorder):
+    # shows the last labelled frame, returning whether to quit
+    if recorder.latest is not None:
+        cv2.imshow('ROBOVISION', recorder.latest)
+    return cv2.waitKey(1) & 0xFF == ord('q')
+
+
+def mainloop(vision_system, video_stream, nav_system, drive_system, kicker_system, debug_tools=None, fps_counter=None,
+        telemetry=None):
     if DEBUG_MODE:
-        (raw_debug_writer, labelled_debug_writer, progress_bar) = debug_tools
-        frames_this_sec = 0
-        last_sec_fps = 0
-        last_sec_time = time()
+        (recorder, progress_bar) = debug_tools
 
     while True:
         frame = next(video_stream)
         vision_system.update_with_frame(frame)
-        nav_system.update()
-        
+        snapshot = vision_system.snapshot()
+        nav_system.update(snapshot)
+        if telemetry is not None:
+            telemetry.log(frame, snapshot, nav_system.state, drive_system.last_command)
 
         if DEBUG_MODE:
-            # update fps
-            raw_debug_writer.write(frame.get())
-            frames_this_sec += 1
-            now_time = time()
-
-            if now_time - last_sec_time >= 1:
-                last_sec_time = now_time
-                last_sec_fps = frames_this_sec
-                frames_this_sec = 0
-
-            # label image with bounding boxes and fps
-            vision_system.label_frame(frame)
-            frame.link_bgr(cv2.putText(
-                frame.get(),
-                text="FPS: %d" % last_sec_fps,
-                org=(15, 15),
-                fontFace=cv2.FONT_HERSHEY_PLAIN,
-                fontScale=1.5,
-                color=(0, 255, 255)
-            ))
-
-            labelled_debug_writer.write(frame.get())
+            count_frame(fps_counter)
+            # the recorder labels, encodes and then releases the frame on its own thread
+            recorder.record(frame, snapshot)
+            progress_bar.update()
+
+            if SHOW_LIVE and show_live(recorder):
+                break
+        else:
+            # hand the frame's buffers back to the video stream for reuse
+            frame.release()
+
+
+def mainloop_pipelined(vision_system, video_stream, nav_system, drive_system, kicker_system, debug_tools=None, fps_counter=None,
+        telemetry=None):
+    if DEBUG_MODE:
+        (recorder, progress_bar) = debug_tools
 
+    def capture():
+        return next(video_stream)
+
+    def detect(frame):
+        vision_system.update_with_frame(frame)
+        return (frame, vision_system.snapshot())
+
+    def navigate(frame_and_snapshot):
+        frame, snapshot = frame_and_snapshot
+        nav_system.update(snapshot)
+        if telemetry is not None:
+            telemetry.log(frame, snapshot, nav_system.state, drive_system.last_command)
+
+        if DEBUG_MODE:
+            count_frame(fps_counter)
+            # recording may fall behind briefly, but never holds up the control loop: the
+            # recorder drops its oldest frames instead, and releases each frame when done
+            recorder.record(frame, snapshot)
             progress_bar.update()
 
-            if SHOW_LIVE:
-                cv2.imshow('ROBOVISION', frame.get())
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+            if SHOW_LIVE and show_live(recorder):
+                pipeline.stop()
+        else:
+            frame.release()
+
+    stages = [
+        Stage("capture", capture),
+        # always detect and act on the freshest frame, skipping any that arrived meanwhile
+        Stage("detect", detect, policy=QueuePolicies.LatestOnly),
+        Stage("navigate", navigate, policy=QueuePolicies.LatestOnly)
+    ]
+
+    # frames skipped by a queue policy are released straight away, so their buffers are reused
+    release_frame = lambda item: (item[0] if type(item) is tuple else item).release()
+
+    pipeline = Pipeline(stages, on_drop=release_frame)
+    pipeline.run()
+
+
+def warm_up(vision_system, video_stream, nav_system, drive_system, kicker_system, frames=WARM_UP_FRAMES):
+    # runs frames of a synthetic scene, at the camera's resolution and in its colorspace, through
+    # detection and navigation with the drive and kicker disarmed, then forgets all they saw
+    camera = SimulatedCamera(fps=None, resolution=video_stream.resolution)
+    colorspace = video_stream.capture_colorspace
+    start_time = perf_counter()
+
+    drive_system.armed = kicker_system.armed = False
+    try:
+        for seq in range(frames):
+            _, bgr_img = camera.read()
+            if video_stream.unpacker is not None:
+                # through the stream's own YUV path, so that it is warmed (and checked) too
+                img = video_stream.unpacker.from_bgr(bgr_img, np.empty_like(bgr_img))
+            else:
+                img = colorspace.value.bgr2this(bgr_img)
+            frame = Frame(img, pool=video_stream.frame_pool, colorspace=colorspace)
+            # spaced as the camera's would be, so that the scheduler and tracking run as they will
+            frame.seq = seq
+            frame.timestamp = start_time + seq / 30
+
+            vision_system.update_with_frame(frame)
+            nav_system.update(vision_system.snapshot(), frame.timestamp)
+            frame.release()
+    finally:
+        drive_system.armed = kicker_system.armed = True
+        drive_system.last_command = None
+
+    vision_system.reset()
+    nav_system.reset()
+    Instrumentation.reset()
+
+
+@contextmanager
+def startup_phase(name):
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        startup_phases.append((name, perf_counter() - start))
+
+
+def startup_report():
+    lines = ["cold start took %.3fs:" % sum(seconds for _, seconds in startup_phases)]
+    lines += ["  %-14s %8.1f ms" % (name, seconds * 1000) for name, seconds in startup_phases]
+    return "\n".join(lines)
+
+
+def setup_telemetry(vision_system):
+    index = 0
+    while os.path.isfile(relpath('debug_data', 'telemetry%d.tlog' % index)):
+        index += 1
+    os.makedirs(relpath('debug_data'), exist_ok=True)
+    return TelemetryLog(relpath('debug_data', 'telemetry%d.tlog' % index), vision_system.objects_to_track, states=NavStates)
+
+
+def setup_instrumentation():
+    # stage timings can be switched on and off while the robot runs, with
+    #   kill -USR1 <pid>  to toggle them (or start with EGB320_INSTRUMENT=1)
+    #   kill -USR2 <pid>  to print them
+    # and are printed on exit whenever any were recorded
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda *_: Instrumentation.enable(not Instrumentation.is_enabled()))
+        signal.signal(signal.SIGUSR2, lambda *_: print(Instrumentation.report()))
+
 
 def debug_print(message):
     global progress_bar
@@ -131,26 +309,54 @@ def debug_print(message):
 
 
 if __name__ == '__main__':
-    video_stream = VideoStream(downsample_scale=8)
-    vision_system = setup_vision_system(video_stream.resolution)
-    drive_system = DriveSystem(speed_modifier=0.5)
-    kicker_system = KickerSystem()
-    nav_system = NavigationSystem(vision_system, drive_system, kicker_system, debug_print=debug_print)
+    # each phase of start-up is timed, and the times printed before the loop starts
+    with startup_phase("camera_open"):
+        video_stream = VideoStream(downsample_scale=8, capture_colorspace=CAPTURE_COLORSPACE)
+    with startup_phase("models"):
+        vision_system = setup_vision_system(video_stream.resolution)
+    with startup_phase("hardware"):
+        drive_system = DriveSystem(speed_modifier=0.5)
+        kicker_system = KickerSystem()
+        nav_system = NavigationSystem(vision_system, drive_system, kicker_system, debug_print=debug_print)
+    setup_instrumentation()
 
-    if DEBUG_MODE:
-        debug_tools = setup_debug_tools(video_stream.resolution)
-    else:
-        debug_tools = None
-        
-    debug_print("Beginning mainloop!")
+    fps_counter = new_fps_counter()
+    with startup_phase("debug_tools"):
+        telemetry = setup_telemetry(vision_system) if TELEMETRY else None
+        if DEBUG_MODE:
+            debug_tools = setup_debug_tools(video_stream.resolution, vision_system, fps_counter)
+        else:
+            debug_tools = None
 
     try:
-        mainloop(vision_system, video_stream, nav_system, drive_system, kicker_system, debug_tools)
+        with startup_phase("prepare"):
+            vision_system.prepare(CAPTURE_COLORSPACE)
+        if WARM_UP_FRAMES:
+            with startup_phase("warm_up"):
+                warm_up(vision_system, video_stream, nav_system, drive_system, kicker_system)
+        with startup_phase("camera_start"):
+            if not video_stream.start(wait=True, timeout=CAMERA_START_TIMEOUT):
+                debug_print("no frame from the camera after %ds, starting anyway" % CAMERA_START_TIMEOUT)
+        tqdm.write(startup_report())
+
+        debug_print("Beginning mainloop!")
+        if PIPELINED:
+            mainloop_pipelined(vision_system, video_stream, nav_system, drive_system, kicker_system, debug_tools, fps_counter, telemetry)
+        else:
+            mainloop(vision_system, video_stream, nav_system, drive_system, kicker_system, debug_tools, fps_counter, telemetry)
     except KeyboardInterrupt:
         debug_print("interrupt received, packing up...")
     finally:
-        video_stream.close()
+        # the recorder finishes with its queued frames before the stream they're from closes
         if DEBUG_MODE:
             cleanup_debug_tools(debug_tools)
+        if telemetry is not None:
+            telemetry.close()
+        video_stream.close()
+        vision_system.close()
         cv2.destroyAllWindows()
+        if Instrumentation.stats():
+            print(Instrumentation.report())
+        if Hardware.simulated_gpio() is not None:
+            print(Hardware.simulated_gpio().report())
         debug_print("All done!")
\ No newline at end of file
@@ -0,0 +1,22 @@
+# Converts a recording into a memory-mapped FrameStore, which can then be opened anywhere a
+# video path is accepted (eg. VideoStream('debug_data/final_countdown_store'))
+import argparse
+from VisionSystem import FrameStore
+from VisionSystem.DetectionModel import ColorSpaces
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert a recording into a memory-mapped frame store")
+    parser.add_argument("video_path")
+    parser.add_argument("store_path")
+    parser.add_argument("--downsample-scale", type=float, default=1)
+    parser.add_argument("--colorspaces", nargs='*', default=[], choices=[colorspace.name for colorspace in ColorSpaces],
+        help="colorspaces to precompute planes for, in addition to BGR")
+    args = parser.parse_args()
+
+    FrameStore.convert(
+        args.video_path,
+        args.store_path,
+        downsample_scale=args.downsample_scale,
+        colorspaces=[ColorSpaces[name] for name in args.colorspaces]
+    )